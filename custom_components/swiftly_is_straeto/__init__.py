@@ -2,15 +2,20 @@
 
 from __future__ import annotations
 
+import asyncio
+
 from homeassistant.const import CONF_API_KEY, Platform
 from homeassistant.core import HomeAssistant
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.util import dt as dt_util
 
-from .api import SwiftlyAPIClient
 from .coordinator import (
     SwiftlyIsStraetoConfigEntry,
-    SwiftlyIsStraetoDataUpdateCoordinator,
+    SwiftlyIsStraetoData,
+    SwiftlyIsStraetoPredictionCoordinator,
+    SwiftlyIsStraetoVehicleCoordinator,
 )
+from .polling import PollingPlan, PollingSchedule
+from .utils import async_configure_rate_limit, async_get_api_client
 
 _PLATFORMS: list[Platform] = [Platform.SENSOR, Platform.DEVICE_TRACKER]
 
@@ -19,16 +24,42 @@ async def async_setup_entry(
     hass: HomeAssistant, entry: SwiftlyIsStraetoConfigEntry
 ) -> bool:
     """Set up Swiftly IS Straeto from a config entry."""
-    api_key = entry.data[CONF_API_KEY]
-    session = async_get_clientsession(hass)
-    api_client = SwiftlyAPIClient(api_key, session)
-    coordinator = SwiftlyIsStraetoDataUpdateCoordinator(hass, entry, api_client)
-    await coordinator.async_config_entry_first_refresh()
-    entry.runtime_data = coordinator
+    api_client = async_get_api_client(hass, entry.data[CONF_API_KEY])
+    async_configure_rate_limit(api_client, entry)
+    polling_schedule = PollingSchedule(dt_util.get_default_time_zone())
+    plan = PollingPlan.from_entry(entry)
+    runtime_data = SwiftlyIsStraetoData(
+        vehicles=SwiftlyIsStraetoVehicleCoordinator(
+            hass, entry, api_client, polling_schedule, plan
+        ),
+        predictions=SwiftlyIsStraetoPredictionCoordinator(
+            hass, entry, api_client, polling_schedule, plan
+        ),
+        polling_schedule=polling_schedule,
+    )
+    await asyncio.gather(
+        runtime_data.vehicles.async_config_entry_first_refresh(),
+        runtime_data.predictions.async_config_entry_first_refresh(),
+    )
+    entry.runtime_data = runtime_data
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
     await hass.config_entries.async_forward_entry_setups(entry, _PLATFORMS)
     return True
 
 
+async def _async_update_listener(
+    hass: HomeAssistant, entry: SwiftlyIsStraetoConfigEntry
+) -> None:
+    """Apply changed options and subentries."""
+    runtime_data = entry.runtime_data
+    async_configure_rate_limit(runtime_data.vehicles.api_client, entry)
+    # Subentries were added, removed or reconfigured if the plan changed.
+    plan = PollingPlan.from_entry(entry)
+    for coordinator in (runtime_data.vehicles, runtime_data.predictions):
+        if coordinator.async_set_plan(plan):
+            await coordinator.async_request_refresh()
+
+
 async def async_unload_entry(
     hass: HomeAssistant, entry: SwiftlyIsStraetoConfigEntry
 ) -> bool:
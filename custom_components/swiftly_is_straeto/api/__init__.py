@@ -1,7 +1,19 @@
 """Swiftly API Client."""
 
-from aiohttp import ClientSession
+import asyncio
+from collections.abc import Awaitable, Mapping, Sequence
+from dataclasses import dataclass
+import hashlib
+import logging
+import random
+import time
+from typing import Any, cast
 
+from aiohttp import ClientError, ClientSession
+
+from .changes import UNCHANGED, ResponseTracker, ResponseValidator, Unchanged
+from .circuit_breaker import CircuitBreaker, CircuitOpenError, CircuitState
+from .decoder import DECODE_ERRORS, DECODER_NAME, JSONDecoder, json_loads
 from .models import (
     JSONInfoData,
     JSONInfoResponse,
@@ -13,14 +25,24 @@ from .models import (
     JSONRoute,
     JSONRouteData,
     JSONRouteResponse,
+    JSONShape,
     JSONStop,
     JSONVehicle,
     JSONVehicleDetailData,
     JSONVehicleDetailResponse,
 )
+from .rate_limit import TokenBucket, backoff_delay, retry_after_seconds
 
 __all__ = [
+    "DECODER_NAME",
+    "OUTAGE_ERRORS",
+    "STOP_ERRORS",
+    "UNCHANGED",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "CircuitState",
     "InvalidRequestError",
+    "JSONDecoder",
     "JSONInfoData",
     "JSONInfoResponse",
     "JSONLocation",
@@ -31,16 +53,34 @@ __all__ = [
     "JSONRoute",
     "JSONRouteData",
     "JSONRouteResponse",
+    "JSONShape",
     "JSONStop",
     "JSONVehicle",
     "JSONVehicleDetailData",
     "JSONVehicleDetailResponse",
     "RateLimitExceededError",
+    "ResponseTracker",
+    "ServerError",
     "SwiftlyAPIClient",
+    "TokenBucket",
     "UnauthorizedError",
+    "Unchanged",
     "UnexpectedAPIError",
+    "batch_stops",
+    "split_predictions",
 ]
 
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class _FreshResponse:
+    """Response reused for identical requests until it expires."""
+
+    data: dict
+    validator: ResponseValidator
+    expires_at: float
+
 
 class RateLimitExceededError(Exception):
     """Raised when Swiftly API rate limit is exceeded."""
@@ -58,17 +98,73 @@ class UnexpectedAPIError(Exception):
     """Raised when Swiftly API returns an unexpected error."""
 
 
+class ServerError(UnexpectedAPIError):
+    """Raised when Swiftly API returns a server error."""
+
+
+# Errors that only affect the stops of the failing request
+STOP_ERRORS = (
+    ClientError,
+    InvalidRequestError,
+    RateLimitExceededError,
+    TimeoutError,
+    UnexpectedAPIError,
+)
+
+# Errors that mean the API is down rather than the request being wrong
+OUTAGE_ERRORS = (CircuitOpenError, ClientError, ServerError, TimeoutError)
+
+
 class SwiftlyAPIClient:
     """Client to interact with Swiftly API."""
 
     BASE_URL = "https://api.goswift.ly"
     AGENCY_KEY = "is-straeto"
+    MAX_STOPS_PER_REQUEST = 10
+    RATE_LIMIT = 180
+    RATE_LIMIT_PERIOD = 900
+    RATE_LIMIT_BURST = 10
+    MAX_RETRIES = 3
+    RETRY_BACKOFF = 1.0
+    MAX_WAIT = 60.0
+    REQUEST_TIMEOUT = 30.0
 
-    def __init__(self, api_key: str, session: ClientSession) -> None:
-        """Initialize the Swiftly API Client."""
+    def __init__(
+        self,
+        api_key: str,
+        session: ClientSession,
+        rate_limiter: TokenBucket | None = None,
+        decoder: JSONDecoder = json_loads,
+        freshness: float = 0.0,
+        circuit_breaker: CircuitBreaker | None = None,
+    ) -> None:
+        """Initialize the Swiftly API Client.
+
+        :param rate_limiter: Token bucket shared by all requests. Defaults to the
+            standard Swiftly quota of RATE_LIMIT requests per RATE_LIMIT_PERIOD.
+        :param decoder: Function decoding a raw response body. Defaults to orjson
+            or msgspec when installed, and the standard library otherwise.
+        :param freshness: Seconds a completed response is reused for identical
+            requests without asking the API again. Responses are dropped once
+            they expire.
+        :param circuit_breaker: Breaker that stops requests while the API keeps
+            failing. Defaults to opening after five failures in a row.
+        """
         self.api_key = api_key
         self.session = session
         self.headers = {"Authorization": api_key, "Accept": "application/json"}
+        self.multi_stop_supported = True
+        self.decoder = decoder
+        self.freshness = freshness
+        self._fresh: dict[tuple[str, frozenset], _FreshResponse] = {}
+        self._inflight: dict[
+            tuple[tuple[str, frozenset], ResponseTracker | None],
+            asyncio.Future[dict | Unchanged],
+        ] = {}
+        self.rate_limiter = rate_limiter or TokenBucket(
+            self.RATE_LIMIT, self.RATE_LIMIT_PERIOD, self.RATE_LIMIT_BURST
+        )
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
 
     def _raise_for_status(self, status_code: int) -> None:
         """Raise appropriate exceptions based on status code."""
@@ -79,23 +175,171 @@ class SwiftlyAPIClient:
         if status_code == 400:
             raise InvalidRequestError("Invalid request.")
         if status_code >= 500:
-            raise UnexpectedAPIError("Unexpected server error.")
+            raise ServerError(f"Unexpected server error {status_code}.")
 
     def _validate_response(self, response: dict) -> None:
         """Validate the API response has success and data."""
+        if not isinstance(response, dict):
+            raise UnexpectedAPIError("API response is not a JSON object.")
         if not response.get("success", False):
             raise UnexpectedAPIError("API response indicates failure.")
         if "data" not in response:
             raise UnexpectedAPIError("API response missing data field.")
 
+    async def _get(
+        self,
+        url: str,
+        params: dict[str, Any] | None = None,
+        timeout: float | None = None,
+        tracker: ResponseTracker | None = None,
+    ) -> dict | Unchanged:
+        """Return the validated response for a GET request.
+
+        Identical requests, with the same URL, parameters and tracker, share a
+        single request while it is in flight, and its response is reused for
+        identical requests made within the freshness window after it completes.
+
+        :param timeout: Seconds to wait for the response once the request is
+            sent, at most REQUEST_TIMEOUT. Time spent waiting for the rate
+            limiter does not count.
+        :param tracker: Validators of the responses the caller received before.
+            UNCHANGED is returned instead of a response equal to the last one.
+        """
+        key = (url, frozenset((params or {}).items()))
+        fresh = self._fresh.get(key)
+        if fresh is not None and time.monotonic() < fresh.expires_at:
+            if tracker is None:
+                return fresh.data
+            validator = tracker.get(key)
+            tracker.set(key, fresh.validator)
+            if validator is not None and validator.digest == fresh.validator.digest:
+                return UNCHANGED
+            return fresh.data
+        inflight_key = (key, tracker)
+        if (request := self._inflight.get(inflight_key)) is None:
+            request = self._inflight[inflight_key] = asyncio.ensure_future(
+                self._fetch(key, url, params, timeout, tracker)
+            )
+            request.add_done_callback(lambda _: self._inflight.pop(inflight_key, None))
+            # Retrieve the result even if every caller was cancelled.
+            request.add_done_callback(lambda r: r.cancelled() or r.exception())
+        # Cancelling one caller must not cancel the request for the others.
+        return await asyncio.shield(request)
+
+    async def _fetch(
+        self,
+        key: tuple[str, frozenset],
+        url: str,
+        params: dict[str, Any] | None,
+        timeout: float | None = None,
+        tracker: ResponseTracker | None = None,
+    ) -> dict | Unchanged:
+        """Send a rate limited GET request and return the validated response.
+
+        Each request waits for a token from the rate limiter. A 429 response
+        pauses the limiter for the Retry-After period, or an exponential
+        backoff with jitter when the header is missing, and the request is
+        retried up to MAX_RETRIES times.
+
+        The timeout, at most REQUEST_TIMEOUT, only covers the HTTP exchange, so
+        requests queued by the rate limiter wait for their turn. Server errors,
+        connection errors and timeouts are counted by the circuit breaker, and
+        while it is open CircuitOpenError is raised without sending the request.
+
+        With a tracker, the request is conditional on the last response the
+        caller received. When the response is unchanged, either a 304 or a body
+        with the same hash, UNCHANGED is returned without parsing the body. Only
+        the hash and validators are kept, never the response itself.
+        """
+        validator = tracker.get(key) if tracker is not None else None
+        headers = self.headers
+        if validator and (validator.etag or validator.last_modified):
+            headers = dict(headers)
+            if validator.etag:
+                headers["If-None-Match"] = validator.etag
+            if validator.last_modified:
+                headers["If-Modified-Since"] = validator.last_modified
+        if timeout is None or timeout > self.REQUEST_TIMEOUT:
+            timeout = self.REQUEST_TIMEOUT
+        attempt = 0
+        with self.circuit_breaker.attempt():
+            try:
+                while True:
+                    if not await self.rate_limiter.acquire(self.MAX_WAIT):
+                        raise RateLimitExceededError("Rate limit budget exhausted.")
+                    async with (
+                        asyncio.timeout(timeout),
+                        self.session.get(
+                            url, headers=headers, params=params
+                        ) as response,
+                    ):
+                        if response.status >= 500:
+                            self.circuit_breaker.record_failure()
+                        else:
+                            self.circuit_breaker.record_success()
+                        if response.status == 304 and validator:
+                            return UNCHANGED
+                        if response.status == 429:
+                            delay = retry_after_seconds(
+                                response.headers.get("Retry-After")
+                            )
+                            if delay is None:
+                                delay = backoff_delay(
+                                    attempt, self.RETRY_BACKOFF, self.MAX_WAIT
+                                )
+                            else:
+                                delay += random.uniform(0, self.RETRY_BACKOFF)
+                            self.rate_limiter.pause(delay)
+                            if attempt < self.MAX_RETRIES and delay <= self.MAX_WAIT:
+                                attempt += 1
+                                continue
+                        self._raise_for_status(response.status)
+                        body = await response.read()
+                        current = ResponseValidator(
+                            hashlib.blake2b(body, digest_size=16).digest(),
+                            response.headers.get("ETag"),
+                            response.headers.get("Last-Modified"),
+                        )
+                        if validator and validator.digest == current.digest:
+                            tracker.set(key, current)
+                            return UNCHANGED
+                        try:
+                            data = self.decoder(body)
+                        except DECODE_ERRORS as err:
+                            # For example an HTML error page from a proxy
+                            raise UnexpectedAPIError(
+                                f"API response is not valid JSON: {err}"
+                            ) from err
+                        self._validate_response(data)
+                        if tracker is not None:
+                            tracker.set(key, current)
+                        self._keep_fresh(key, data, current)
+                        return data
+            except (ClientError, TimeoutError):
+                self.circuit_breaker.record_failure()
+                raise
+
+    def _keep_fresh(
+        self, key: tuple[str, frozenset], data: dict, validator: ResponseValidator
+    ) -> None:
+        """Reuse a response for identical requests within the freshness window."""
+        if self.freshness <= 0:
+            return
+        fresh = self._fresh[key] = _FreshResponse(
+            data, validator, time.monotonic() + self.freshness
+        )
+
+        def _expire() -> None:
+            if self._fresh.get(key) is fresh:
+                del self._fresh[key]
+
+        asyncio.get_running_loop().call_later(self.freshness, _expire)
+
     async def get_agency_info(self) -> JSONInfoData:
         """Fetch agency information from Swiftly API."""
         url = f"{self.BASE_URL}/info/{self.AGENCY_KEY}"
-        async with self.session.get(url, headers=self.headers) as response:
-            self._raise_for_status(response.status)
-            data = await response.json()
-            self._validate_response(data)
-            return JSONInfoResponse(**data).get("data")
+        data = await self._get(url)
+        return cast(JSONInfoResponse, data)["data"]
 
     async def get_routes(
         self, route: list[str] | None = None, verbose=False
@@ -111,41 +355,48 @@ class SwiftlyAPIClient:
             params["route"] = ",".join(route)
         if verbose:
             params["verbose"] = "true"
-        async with self.session.get(
-            url, headers=self.headers, params=params
-        ) as response:
-            self._raise_for_status(response.status)
-            data = await response.json()
-            self._validate_response(data)
-            return JSONRouteResponse(**data).get("data")
+        data = await self._get(url, params)
+        return cast(JSONRouteResponse, data)["data"]
 
     async def get_predictions(
-        self, stop_id: str, route: list[str] | None = None, number=1
-    ) -> JSONPredictionResponseData:
+        self,
+        stop_id: str | list[str],
+        route: Sequence[str] | None = None,
+        number=1,
+        timeout: float | None = None,
+        tracker: ResponseTracker | None = None,
+    ) -> JSONPredictionResponseData | Unchanged:
         """Fetch predictions for a given stop from Swiftly API.
 
-        :param stop_id: The stop ID to fetch predictions for.
+        :param stop_id: The stop ID, or list of stop IDs, to fetch predictions for.
         :param route: Route ID to filter results. Skip to get all routes for stop.
+        :param timeout: Seconds to wait for the response once the request is sent.
+        :param tracker: If given, UNCHANGED is returned when the predictions are
+            the same as the last ones received with it.
         """
         url = f"{self.BASE_URL}/real-time/{self.AGENCY_KEY}/predictions"
+        if isinstance(stop_id, list):
+            stop_id = ",".join(stop_id)
         params = {"stop": stop_id, "number": number}
         if route:
             params["route"] = ",".join(route)
-        async with self.session.get(
-            url, headers=self.headers, params=params
-        ) as response:
-            self._raise_for_status(response.status)
-            data = await response.json()
-            self._validate_response(data)
-            return JSONPredictionResponse(**data).get("data")
+        data = await self._get(url, params, timeout, tracker)
+        if data is UNCHANGED:
+            return UNCHANGED
+        return cast(JSONPredictionResponse, data)["data"]
 
     async def get_vehicles(
-        self, route: list[str] | None = None, verbose=False
-    ) -> JSONVehicleDetailData:
+        self,
+        route: list[str] | None = None,
+        verbose=False,
+        tracker: ResponseTracker | None = None,
+    ) -> JSONVehicleDetailData | Unchanged:
         """Fetch vehicles information from Swiftly API.
 
         :param route: List of route IDs to filter results.
         :param verbose: If True, fetch detailed vehicle information.
+        :param tracker: If given, UNCHANGED is returned when the vehicles are the
+            same as the last ones received with it.
         """
         url = f"{self.BASE_URL}/real-time/{self.AGENCY_KEY}/vehicles"
         params = {}
@@ -153,10 +404,164 @@ class SwiftlyAPIClient:
             params["route"] = ",".join(route)
         if verbose:
             params["verbose"] = "true"
-        async with self.session.get(
-            url, headers=self.headers, params=params
-        ) as response:
-            self._raise_for_status(response.status)
-            data = await response.json()
-            self._validate_response(data)
-            return JSONVehicleDetailResponse(**data).get("data")
+        data = await self._get(url, params, tracker=tracker)
+        if data is UNCHANGED:
+            return UNCHANGED
+        return cast(JSONVehicleDetailResponse, data)["data"]
+
+    async def get_predictions_for_stops(
+        self,
+        stops: Mapping[str, Sequence[str]],
+        max_concurrent: int = 4,
+        timeout: float | None = 10,
+        number=1,
+        batches: Sequence[Mapping[str, Sequence[str]]] | None = None,
+        errors: dict[str, Exception] | None = None,
+        tracker: ResponseTracker | None = None,
+    ) -> dict[str, list[JSONPredictionData] | Unchanged]:
+        """Fetch predictions for several stops, coalescing them into few requests.
+
+        Stops are grouped into batches of at most MAX_STOPS_PER_REQUEST and each
+        batch is fetched with a single multi-stop request. The batches are
+        fetched concurrently and the results are split back per stop, in the
+        same order as the stops mapping. A batch that fails is retried with one
+        request per stop, and if every stop of a rejected batch then succeeds,
+        the API does not accept multi-stop requests and batching is turned off
+        for this client.
+
+        :param stops: Mapping of stop ID to route IDs to filter results.
+        :param max_concurrent: Maximum number of requests in flight at once.
+        :param timeout: Seconds to wait for the response to each request once it
+            is sent, at most REQUEST_TIMEOUT. Requests queued by the rate limiter
+            wait for their turn without this running out.
+        :param batches: Stops already split with batch_stops, to skip doing it again.
+        :param errors: If given, failing stops are left out of the result and their
+            STOP_ERRORS are stored here by stop ID, instead of being raised.
+        :param tracker: If given, stops whose response is the same as the last one
+            received with it map to UNCHANGED instead of their predictions.
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrent))
+
+        async def _request(
+            stop_id: str | list[str], route: Sequence[str]
+        ) -> JSONPredictionResponseData | Unchanged:
+            async with semaphore:
+                return await self.get_predictions(
+                    stop_id, route, number, timeout, tracker
+                )
+
+        def _split(
+            batch: Mapping[str, Sequence[str]],
+            response: JSONPredictionResponseData | Unchanged,
+        ) -> dict[str, list[JSONPredictionData] | Unchanged]:
+            if response is UNCHANGED:
+                return dict.fromkeys(batch, UNCHANGED)
+            return dict(split_predictions(batch, response))
+
+        def _failed(
+            batch: Mapping[str, Sequence[str]], err: Exception
+        ) -> dict[str, list[JSONPredictionData] | Unchanged]:
+            if errors is None:
+                raise err
+            for stop_id in batch:
+                errors[stop_id] = err
+            return {}
+
+        async def _fetch_stop(
+            stop_id: str, route: Sequence[str]
+        ) -> dict[str, list[JSONPredictionData] | Unchanged]:
+            try:
+                response = await _request(stop_id, route)
+            except STOP_ERRORS as err:
+                return _failed({stop_id: route}, err)
+            return _split({stop_id: route}, response)
+
+        async def _fetch_stops(
+            batch: Mapping[str, Sequence[str]],
+        ) -> dict[str, list[JSONPredictionData] | Unchanged]:
+            result: dict[str, list[JSONPredictionData] | Unchanged] = {}
+            for response in await _gather(
+                [_fetch_stop(stop_id, route) for stop_id, route in batch.items()]
+            ):
+                result.update(response)
+            return result
+
+        async def _fetch_batch(
+            batch: Mapping[str, Sequence[str]],
+        ) -> dict[str, list[JSONPredictionData] | Unchanged]:
+            if len(batch) == 1 or not self.multi_stop_supported:
+                return await _fetch_stops(batch)
+            routes = (
+                list(dict.fromkeys(r for route in batch.values() for r in route))
+                if all(batch.values())
+                else []
+            )
+            try:
+                response = await _request(list(batch), routes)
+            except (
+                ClientError,
+                RateLimitExceededError,
+                ServerError,
+                TimeoutError,
+            ) as err:
+                # Sending the stops one by one would not fare any better, and
+                # would only add load while the API is struggling.
+                return _failed(batch, err)
+            except (InvalidRequestError, UnexpectedAPIError) as err:
+                _LOGGER.debug(
+                    "Batch request for stops %s failed, fetching per stop: %s",
+                    ",".join(batch),
+                    err,
+                )
+                result = await _fetch_stops(batch)
+                if isinstance(err, InvalidRequestError) and len(result) == len(batch):
+                    # Every stop works on its own, so the API does not accept
+                    # multi-stop requests. If any stop still failed, it was that
+                    # stop the API rejected, and batching is kept.
+                    self.multi_stop_supported = False
+                return result
+            return _split(batch, response)
+
+        if batches is None:
+            batches = batch_stops(stops, self.MAX_STOPS_PER_REQUEST)
+        results: dict[str, list[JSONPredictionData] | Unchanged] = {}
+        for result in await _gather([_fetch_batch(batch) for batch in batches]):
+            results.update(result)
+        return {
+            stop_id: results.get(stop_id, [])
+            for stop_id in stops
+            if not errors or stop_id not in errors
+        }
+
+
+def batch_stops(
+    stops: Mapping[str, Sequence[str]], max_stops: int
+) -> list[dict[str, Sequence[str]]]:
+    """Split a stops mapping into groups that can share a single request."""
+    items = list(stops.items())
+    size = max(1, max_stops)
+    return [dict(items[index : index + size]) for index in range(0, len(items), size)]
+
+
+def split_predictions(
+    stops: Mapping[str, Sequence[str]], response: JSONPredictionResponseData
+) -> dict[str, list[JSONPredictionData]]:
+    """Split a predictions response into the requested stop and route pairs."""
+    result: dict[str, list[JSONPredictionData]] = {stop_id: [] for stop_id in stops}
+    for item in response.get("predictionsData", []):
+        routes = stops.get(item["stopId"])
+        if routes is None or (routes and item["routeId"] not in routes):
+            continue
+        result[item["stopId"]].append(item)
+    return result
+
+
+async def _gather(coros: list[Awaitable[Any]]) -> list[Any]:
+    """Run awaitables concurrently, cancelling the rest if one fails."""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
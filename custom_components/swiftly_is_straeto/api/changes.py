@@ -0,0 +1,64 @@
+"""Detection of unchanged Swiftly API responses."""
+
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass
+from enum import Enum
+
+
+class Unchanged(Enum):
+    """Marker returned instead of data that has not changed."""
+
+    UNCHANGED = "unchanged"
+
+
+UNCHANGED = Unchanged.UNCHANGED
+
+
+@dataclass(frozen=True, slots=True)
+class ResponseValidator:
+    """Identifies a response body without keeping the body."""
+
+    digest: bytes
+    etag: str | None = None
+    last_modified: str | None = None
+
+
+class ResponseTracker:
+    """Validators of the last responses one caller received.
+
+    A caller that keeps the models it built from a response passes its tracker
+    with each request, and gets UNCHANGED instead of the data when the response
+    is the same as the last one it received for that request. Only validators
+    are kept, never the responses, for at most max_entries requests with the
+    least recently used dropped first.
+    """
+
+    def __init__(self, max_entries: int = 32) -> None:
+        """Initialize the tracker.
+
+        :param max_entries: Requests to remember validators for.
+        """
+        self.max_entries = max(1, max_entries)
+        self._validators: OrderedDict[Hashable, ResponseValidator] = OrderedDict()
+
+    def __len__(self) -> int:
+        """Return the number of requests with validators."""
+        return len(self._validators)
+
+    def get(self, key: Hashable) -> ResponseValidator | None:
+        """Return the validator of the last response to a request."""
+        if (validator := self._validators.get(key)) is not None:
+            self._validators.move_to_end(key)
+        return validator
+
+    def set(self, key: Hashable, validator: ResponseValidator) -> None:
+        """Remember the validator of a response the caller received."""
+        self._validators[key] = validator
+        self._validators.move_to_end(key)
+        while len(self._validators) > self.max_entries:
+            self._validators.popitem(last=False)
+
+    def clear(self) -> None:
+        """Forget every response, so the next requests return data."""
+        self._validators.clear()
@@ -0,0 +1,107 @@
+"""Circuit breaker for Swiftly API outages."""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from enum import StrEnum
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised when a request is refused because the Swiftly API keeps failing."""
+
+    def __init__(self, retry_in: float) -> None:
+        """Initialize the error with the seconds left until the next probe."""
+        super().__init__(
+            f"Swiftly API is failing, next attempt in {retry_in:.0f} seconds."
+        )
+        self.retry_in = retry_in
+
+
+class CircuitState(StrEnum):
+    """State of a circuit breaker."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Stop sending requests while the API keeps failing.
+
+    After failure_threshold consecutive failures the circuit opens and every
+    request is refused without reaching the API. Once reset_timeout has passed,
+    a single probe request is let through. If the probe succeeds the circuit
+    closes, otherwise it opens again for twice as long, up to max_reset_timeout.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 60.0,
+        max_reset_timeout: float = 900.0,
+    ) -> None:
+        """Initialize the circuit breaker.
+
+        :param failure_threshold: Consecutive failures that open the circuit.
+        :param reset_timeout: Seconds the circuit stays open before the first probe.
+        :param max_reset_timeout: Longest time the circuit stays open between probes.
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.failures = 0
+        self._open_for = reset_timeout
+        self._opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> CircuitState:
+        """Return the current state of the circuit."""
+        if self._opened_at is None:
+            return CircuitState.CLOSED
+        if self._probing or self.retry_in == 0:
+            return CircuitState.HALF_OPEN
+        return CircuitState.OPEN
+
+    @property
+    def retry_in(self) -> float:
+        """Return the seconds left until a probe request is let through."""
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self._opened_at + self._open_for - time.monotonic())
+
+    @contextmanager
+    def attempt(self) -> Iterator[None]:
+        """Guard a request, raising CircuitOpenError while the circuit is open.
+
+        While the circuit is half open only one request is let through. If it
+        ends without a success or failure being recorded, for example because
+        it was cancelled, the next request probes instead.
+        """
+        probe = False
+        if self._opened_at is not None:
+            if self._probing or self.retry_in > 0:
+                raise CircuitOpenError(self.retry_in)
+            self._probing = probe = True
+        try:
+            yield
+        finally:
+            if probe:
+                self._probing = False
+
+    def record_success(self) -> None:
+        """Close the circuit after a request reached the API."""
+        self.failures = 0
+        self._open_for = self.reset_timeout
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        """Count a failed request, opening the circuit if it keeps failing."""
+        self.failures += 1
+        if self._probing:
+            self._probing = False
+            self._open_for = min(self._open_for * 2, self.max_reset_timeout)
+            self._opened_at = time.monotonic()
+        elif self._opened_at is None and self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
@@ -0,0 +1,30 @@
+"""JSON decoding for Swiftly API responses."""
+
+from collections.abc import Callable
+import json
+from typing import Any
+
+JSONDecoder = Callable[[bytes], Any]
+
+
+def _default_decoder() -> tuple[str, JSONDecoder, tuple[type[Exception], ...]]:
+    """Return the fastest JSON decoder that is installed, and its errors."""
+    try:
+        import orjson  # noqa: PLC0415
+    except ImportError:
+        pass
+    else:
+        return "orjson", orjson.loads, (orjson.JSONDecodeError,)
+    try:
+        import msgspec  # noqa: PLC0415
+    except ImportError:
+        pass
+    else:
+        return "msgspec", msgspec.json.Decoder().decode, (msgspec.DecodeError,)
+    return "json", json.loads, ()
+
+
+DECODER_NAME, json_loads, _DECODER_ERRORS = _default_decoder()
+
+# Errors raised for a body that is not valid JSON, by any of the decoders
+DECODE_ERRORS = (ValueError, UnicodeDecodeError, *_DECODER_ERRORS)
@@ -0,0 +1,114 @@
+"""Client side rate limiting for the Swiftly API."""
+
+import asyncio
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+import random
+import time
+
+
+class TokenBucket:
+    """Token bucket that queues requests to stay within an API quota.
+
+    Tokens refill continuously at limit / period per second, up to burst
+    tokens. Callers wait in FIFO order for a token instead of bursting.
+    """
+
+    def __init__(self, limit: int, period: float, burst: int) -> None:
+        """Initialize the token bucket.
+
+        :param limit: Number of requests allowed per period.
+        :param period: Length of the quota period in seconds.
+        :param burst: Maximum number of requests that can be sent back to back.
+        """
+        self._lock = asyncio.Lock()
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self.limit = limit
+        self.period = period
+        self.burst = max(1, burst)
+        self.rate = limit / period
+        self._tokens = float(self.burst)
+
+    def configure(self, limit: int, period: float, burst: int) -> None:
+        """Change the quota, keeping the tokens currently available."""
+        self._refill(time.monotonic())
+        self.limit = limit
+        self.period = period
+        self.burst = max(1, burst)
+        self.rate = limit / period
+        self._tokens = min(self._tokens, self.burst)
+
+    @property
+    def remaining(self) -> int:
+        """Return the number of requests that can be sent right now."""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return 0
+        self._refill(now)
+        return int(self._tokens)
+
+    @property
+    def paused_for(self) -> float:
+        """Return the seconds left until the API accepts requests again."""
+        return max(0.0, self._paused_until - time.monotonic())
+
+    def pause(self, seconds: float) -> None:
+        """Hold all requests for the given number of seconds."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, max_wait: float | None = None) -> bool:
+        """Wait for a token.
+
+        Returns False, without taking a token, if the token would not be
+        available within max_wait seconds of calling, including the time spent
+        queued behind other callers.
+        """
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        try:
+            async with asyncio.timeout_at(deadline):
+                await self._lock.acquire()
+        except TimeoutError:
+            return False
+        try:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return True
+                    wait = (1 - self._tokens) / self.rate
+                if deadline is not None and now + wait > deadline:
+                    return False
+                await asyncio.sleep(wait)
+        finally:
+            self._lock.release()
+
+    def _refill(self, now: float) -> None:
+        """Add the tokens earned since the last refill."""
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+def retry_after_seconds(value: str | None) -> float | None:
+    """Parse a Retry-After header given as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=UTC)
+    return max(0.0, (retry_at - datetime.now(UTC)).total_seconds())
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Return an exponential backoff delay with full jitter."""
+    return random.uniform(0, min(cap, base * 2**attempt))
@@ -9,15 +9,19 @@ import voluptuous as vol
 
 from homeassistant.config_entries import (
     SOURCE_RECONFIGURE,
+    ConfigEntry,
     ConfigFlow,
     ConfigFlowResult,
     ConfigSubentryFlow,
+    OptionsFlow,
     SubentryFlowResult,
 )
 from homeassistant.const import CONF_API_KEY, CONF_DEVICE, CONF_URL
 from homeassistant.core import HomeAssistant, callback
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers.selector import (
+    NumberSelector,
+    NumberSelectorConfig,
+    NumberSelectorMode,
     SelectOptionDict,
     SelectSelector,
     SelectSelectorConfig,
@@ -26,24 +30,99 @@ from homeassistant.helpers.selector import (
 
 from .api import InvalidRequestError, SwiftlyAPIClient, UnauthorizedError
 from .const import (
+    CONF_ARRIVALS,
+    CONF_MAX_CONCURRENT_REQUESTS,
+    CONF_RATE_LIMIT,
+    CONF_REQUEST_TIMEOUT,
     CONF_ROUTE,
     CONF_ROUTE_NAME,
     CONF_ROUTES,
     CONF_STOPS,
+    CONF_TRACKER_INTERVAL,
     CONF_USER,
+    CONF_VEHICLE_TTL,
+    DEFAULT_ARRIVALS,
+    DEFAULT_MAX_CONCURRENT_REQUESTS,
+    DEFAULT_RATE_LIMIT,
+    DEFAULT_REQUEST_TIMEOUT,
+    DEFAULT_TRACKER_INTERVAL,
+    DEFAULT_VEHICLE_TTL,
     DOMAIN,
     JSON_AGENCY_KEY,
     JSON_DIRECTIONS,
     JSON_ID,
     JSON_NAME,
     JSON_TITLE,
+    MAX_ARRIVALS,
 )
 from .models import ConfigFlowData, Route, RouteStop, StraetoSubentryData
+from .route_cache import async_get_route_cache
+from .utils import async_get_api_client
 
 _LOGGER = logging.getLogger(__name__)
 
 STEP_USER_DATA_SCHEMA = vol.Schema({vol.Required(CONF_API_KEY): str})
 
+OPTIONS_SCHEMA = vol.Schema(
+    {
+        vol.Optional(
+            CONF_MAX_CONCURRENT_REQUESTS, default=DEFAULT_MAX_CONCURRENT_REQUESTS
+        ): vol.All(
+            NumberSelector(
+                NumberSelectorConfig(min=1, max=20, mode=NumberSelectorMode.BOX)
+            ),
+            vol.Coerce(int),
+        ),
+        vol.Optional(CONF_REQUEST_TIMEOUT, default=DEFAULT_REQUEST_TIMEOUT): vol.All(
+            NumberSelector(
+                NumberSelectorConfig(
+                    min=1,
+                    max=60,
+                    mode=NumberSelectorMode.BOX,
+                    unit_of_measurement="s",
+                )
+            ),
+            vol.Coerce(int),
+        ),
+        vol.Optional(CONF_RATE_LIMIT, default=DEFAULT_RATE_LIMIT): vol.All(
+            NumberSelector(
+                NumberSelectorConfig(min=12, max=10000, mode=NumberSelectorMode.BOX)
+            ),
+            vol.Coerce(int),
+        ),
+        vol.Optional(CONF_VEHICLE_TTL, default=DEFAULT_VEHICLE_TTL): vol.All(
+            NumberSelector(
+                NumberSelectorConfig(
+                    min=5,
+                    max=10080,
+                    mode=NumberSelectorMode.BOX,
+                    unit_of_measurement="min",
+                )
+            ),
+            vol.Coerce(int),
+        ),
+        vol.Optional(CONF_ARRIVALS, default=DEFAULT_ARRIVALS): vol.All(
+            NumberSelector(
+                NumberSelectorConfig(
+                    min=1, max=MAX_ARRIVALS, mode=NumberSelectorMode.BOX
+                )
+            ),
+            vol.Coerce(int),
+        ),
+        vol.Optional(CONF_TRACKER_INTERVAL, default=DEFAULT_TRACKER_INTERVAL): vol.All(
+            NumberSelector(
+                NumberSelectorConfig(
+                    min=0,
+                    max=60,
+                    mode=NumberSelectorMode.BOX,
+                    unit_of_measurement="s",
+                )
+            ),
+            vol.Coerce(int),
+        ),
+    }
+)
+
 
 def _filter_routes(hass: HomeAssistant, routes: list[Route]) -> list[Route]:
     """Filter routes that are already configured."""
@@ -55,9 +134,8 @@ def _filter_routes(hass: HomeAssistant, routes: list[Route]) -> list[Route]:
 
 
 def _get_client(hass: HomeAssistant, api_key: str) -> SwiftlyAPIClient:
-    """Create and return a SwiftlyAPIClient."""
-    session = async_get_clientsession(hass)
-    return SwiftlyAPIClient(api_key, session)
+    """Return the shared SwiftlyAPIClient for an API key."""
+    return async_get_api_client(hass, api_key)
 
 
 async def _validate_input(hass: HomeAssistant, data: dict[str, str]) -> ConfigFlowData:
@@ -70,23 +148,25 @@ async def _validate_input(hass: HomeAssistant, data: dict[str, str]) -> ConfigFl
         id=info.get(JSON_AGENCY_KEY),
         url=info.get(CONF_URL),
         api_key=data[CONF_API_KEY],
-        routes=await client.get_routes(),
+        routes=await async_get_route_cache(hass).async_get_routes(client),
     )
 
 
-async def _get_routes(client: SwiftlyAPIClient) -> list[Route]:
+async def _get_routes(hass: HomeAssistant, client: SwiftlyAPIClient) -> list[Route]:
     """Get available routes."""
-    route_data = await client.get_routes()
+    route_data = await async_get_route_cache(hass).async_get_routes(client)
     return route_data.get(CONF_ROUTES, [])
 
 
 async def _get_route_stops(
-    client: SwiftlyAPIClient, route_id: str
+    hass: HomeAssistant, client: SwiftlyAPIClient, route_id: str
 ) -> tuple[str, list[RouteStop]]:
     """Get stops for a given route."""
-    route_data = await client.get_routes([route_id], verbose=True)
+    route = await async_get_route_cache(hass).async_get_route(client, route_id)
+    if route is None:
+        raise InvalidRequestError(f"Route {route_id} not found.")
     return (
-        route_data.get(CONF_ROUTES, [])[0].get(JSON_NAME),
+        route.get(JSON_NAME),
         [
             RouteStop(
                 route_id,
@@ -94,8 +174,7 @@ async def _get_route_stops(
                 direction[JSON_TITLE],
                 stop,
             )
-            for route in route_data.get(CONF_ROUTES, [])
-            for direction in route.get(JSON_DIRECTIONS, [])
+            for direction in route.get(JSON_DIRECTIONS) or []
             for stop in direction.get(CONF_STOPS, [])
         ],
     )
@@ -112,6 +191,14 @@ class SwiftlyIsStraetoConfigFlow(ConfigFlow, domain=DOMAIN):
         """Return subentries supported by this integration."""
         return {CONF_DEVICE: SwiftlyIsStraetoSubentryFlowHandler}
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+        config_entry: ConfigEntry,
+    ) -> SwiftlyIsStraetoOptionsFlowHandler:
+        """Return the options flow handler."""
+        return SwiftlyIsStraetoOptionsFlowHandler()
+
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
     ) -> ConfigFlowResult:
@@ -140,6 +227,24 @@ class SwiftlyIsStraetoConfigFlow(ConfigFlow, domain=DOMAIN):
         )
 
 
+class SwiftlyIsStraetoOptionsFlowHandler(OptionsFlow):
+    """Handle options for Swiftly IS Straeto."""
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> ConfigFlowResult:
+        """Manage request options."""
+        if user_input is not None:
+            return self.async_create_entry(data=user_input)
+
+        return self.async_show_form(
+            step_id="init",
+            data_schema=self.add_suggested_values_to_schema(
+                OPTIONS_SCHEMA, self.config_entry.options
+            ),
+        )
+
+
 class SwiftlyIsStraetoSubentryFlowHandler(ConfigSubentryFlow):
     """Handle a subentry flow for Swiftly IS Straeto."""
 
@@ -157,7 +262,7 @@ class SwiftlyIsStraetoSubentryFlowHandler(ConfigSubentryFlow):
 
         parent_entry = self._get_entry()
         self._client = _get_client(self.hass, parent_entry.data[CONF_API_KEY])
-        routes = await _get_routes(self._client)
+        routes = await _get_routes(self.hass, self._client)
         routes = _filter_routes(self.hass, routes)
         data_schema = vol.Schema(
             {
@@ -209,7 +314,9 @@ class SwiftlyIsStraetoSubentryFlowHandler(ConfigSubentryFlow):
 
         parent_entry = self._get_entry()
         self._client = _get_client(self.hass, parent_entry.data[CONF_API_KEY])
-        (route_name, route_stops) = await _get_route_stops(self._client, route)
+        (route_name, route_stops) = await _get_route_stops(
+            self.hass, self._client, route
+        )
         self._subentry_data[CONF_ROUTE_NAME] = route_name
         data_schema = vol.Schema(
             {
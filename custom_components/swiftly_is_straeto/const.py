@@ -1,7 +1,40 @@
 """Constants for the Swiftly IS Straeto integration."""
 
+from datetime import timedelta
+
 DOMAIN = "swiftly_is_straeto"
 DEFAULT_UPDATE_TIME = 30
+FAST_UPDATE_TIME = 15
+SLOW_UPDATE_TIME = 120
+QUIET_UPDATE_TIME = 300
+IDLE_UPDATE_TIME = 900
+MAX_IDLE_UPDATE_TIME = 3600
+MAX_STOP_RETRY_TIME = 900
+DEFAULT_MAX_CONCURRENT_REQUESTS = 4
+DEFAULT_REQUEST_TIMEOUT = 10
+DEFAULT_RATE_LIMIT = 180
+RESPONSE_FRESHNESS = 5
+DEFAULT_VEHICLE_TTL = 120
+DEFAULT_ARRIVALS = 3
+MAX_ARRIVALS = 10
+ROUTE_CACHE_TTL = timedelta(days=7)
+
+# Adaptive polling thresholds
+IMMINENT_ARRIVAL = timedelta(minutes=5)
+NEAR_ARRIVAL = timedelta(minutes=15)
+SERVICE_GAP = timedelta(minutes=30)
+SERVICE_START_LEAD = timedelta(minutes=15)
+
+# Local countdown to arrivals between polls
+COUNTDOWN_INTERVAL = timedelta(seconds=10)
+DRIFT_SMOOTHING = 0.5
+MAX_DRIFT = 1.0
+
+# Local dead reckoning of tracker positions between polls
+DEFAULT_TRACKER_INTERVAL = 5
+MAX_DEAD_RECKONING = 90
+MAX_SNAP_DISTANCE = 50.0
+SNAP_WINDOW = 20
 
 CONF_USER = "user"
 CONF_ROUTES = "routes"
@@ -9,8 +42,15 @@ CONF_ROUTE = "route"
 CONF_STOPS = "stops"
 CONF_ROUTE_NAME = "route_name"
 CONF_STOP_NAME = "stop_name"
+CONF_MAX_CONCURRENT_REQUESTS = "max_concurrent_requests"
+CONF_REQUEST_TIMEOUT = "request_timeout"
+CONF_RATE_LIMIT = "rate_limit"
+CONF_VEHICLE_TTL = "vehicle_ttl"
+CONF_ARRIVALS = "arrivals"
+CONF_TRACKER_INTERVAL = "tracker_interval"
 
 ATTR_DIRECTION = "direction"
+ATTR_STALE_SINCE = "stale_since"
 
 # JSON keys
 JSON_ROUTE_ID = "routeId"
@@ -36,3 +76,36 @@ JSON_DIRECTIONS = "directions"
 JSON_AGENCY_KEY = "agencyKey"
 JSON_NAME = "name"
 JSON_TITLE = "title"
+
+# Vehicle fields only returned by the verbose vehicles endpoint
+VERBOSE_VEHICLE_FIELDS = frozenset(
+    {
+        "blockAssignmentInfo",
+        "blockId",
+        "directionId",
+        "distanceAlongStopPath",
+        "gtfsStopSequence",
+        "inYard",
+        "isAddedService",
+        "isAtStop",
+        "isAtWaitStop",
+        "isOnDetour",
+        "isPredictable",
+        "layover",
+        "layoverDepTime",
+        "layoverDepTimeStr",
+        "nextStopId",
+        "nextStopName",
+        "nextStopPathIndex",
+        "oaOptimalDepartureTimeEpochMsecs",
+        "oaOptimalDepartureTimeStr",
+        "serviceDate",
+        "serviceId",
+        "stopPathIndex",
+        "stopScheduleTimeEpochMsecs",
+        "stopScheduleTimeStr",
+        "tripId",
+        "tripPattern",
+        "tripShortName",
+    }
+)
@@ -1,21 +1,73 @@
-"""DataUpdateCoordinator for Swiftly integration."""
+"""DataUpdateCoordinators for Swiftly integration."""
 
-from datetime import timedelta
+from abc import ABC, abstractmethod
+from collections.abc import Hashable, Iterable
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import _LOGGER, HomeAssistant
-from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.core import _LOGGER, HomeAssistant, callback
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
 
-from .api import SwiftlyAPIClient
-from .const import DEFAULT_UPDATE_TIME, JSON_PREDICTIONS_DATA, JSON_VEHICLES
-from .models import CoordinatorData, Prediction, Vehicle
-from .utils import get_subentry_data
+from .api import OUTAGE_ERRORS, UNCHANGED, ResponseTracker, SwiftlyAPIClient
+from .api.rate_limit import backoff_delay
+from .const import (
+    CONF_ARRIVALS,
+    CONF_MAX_CONCURRENT_REQUESTS,
+    CONF_REQUEST_TIMEOUT,
+    CONF_TRACKER_INTERVAL,
+    CONF_VEHICLE_TTL,
+    DEFAULT_ARRIVALS,
+    DEFAULT_MAX_CONCURRENT_REQUESTS,
+    DEFAULT_REQUEST_TIMEOUT,
+    DEFAULT_TRACKER_INTERVAL,
+    DEFAULT_UPDATE_TIME,
+    DEFAULT_VEHICLE_TTL,
+    JSON_VEHICLES,
+    MAX_STOP_RETRY_TIME,
+    VERBOSE_VEHICLE_FIELDS,
+)
+from .countdown import ArrivalCountdown
+from .dead_reckoning import DeadReckoning
+from .fleet import AdherenceStats, FleetSnapshot
+from .models import (
+    VEHICLE_FIELDS,
+    CoordinatorData,
+    Prediction,
+    SnapshotDelta,
+    Vehicle,
+)
+from .polling import PollingPlan, PollingSchedule
+from .route_cache import async_get_route_cache
 
-type SwiftlyIsStraetoConfigEntry = ConfigEntry[SwiftlyIsStraetoDataUpdateCoordinator]
+# Only ask for the verbose vehicle payload when a field we use needs it
+VERBOSE_VEHICLES = not VEHICLE_FIELDS.isdisjoint(VERBOSE_VEHICLE_FIELDS)
 
 
-class SwiftlyIsStraetoDataUpdateCoordinator(DataUpdateCoordinator[CoordinatorData]):
-    """Class to manage fetching Swiftly IS Straeto data from API."""
+type SwiftlyIsStraetoConfigEntry = ConfigEntry[SwiftlyIsStraetoData]
+
+
+class SwiftlyIsStraetoDataUpdateCoordinator[KeyT: Hashable, ItemT](
+    DataUpdateCoordinator[CoordinatorData[KeyT, ItemT]], ABC
+):
+    """Base class for the Swiftly IS Straeto refresh pipelines.
+
+    Vehicles and predictions are refreshed by separate coordinators, each with
+    its own interval, error state and listeners, so a slow or failing endpoint
+    only holds back the entities that use it.
+
+    Every refresh is compared with the previous one by item key. The keys that
+    were added, removed or changed are published as delta, and only entities
+    listening with one of those keys as context are updated. Listeners without
+    a context, such as the platform listeners adding new entities, are always
+    updated.
+
+    When the Swiftly API is down, or the client's circuit breaker is open, the
+    last snapshot is served again marked with stale_since, instead of making
+    every entity unavailable, and the next refresh waits until the breaker lets
+    a probe request through.
+    """
 
     config_entry: SwiftlyIsStraetoConfigEntry
 
@@ -24,49 +76,477 @@ class SwiftlyIsStraetoDataUpdateCoordinator(DataUpdateCoordinator[CoordinatorDat
         hass: HomeAssistant,
         config_entry: SwiftlyIsStraetoConfigEntry,
         api_client: SwiftlyAPIClient,
+        polling_schedule: PollingSchedule,
+        plan: PollingPlan,
+        name: str,
     ) -> None:
         """Initialize Swiftly IS Straeto data updater."""
         self.api_client = api_client
         self.config_entry = config_entry
+        self.polling_schedule = polling_schedule
+        self.plan = plan
+        self._replanned = False
+        self._notified_success = True
+        self._fetched_at: datetime | None = None
+        # Validators of the responses the current models were built from
+        self._tracker = ResponseTracker()
+        self.delta: SnapshotDelta[KeyT] = SnapshotDelta()
         super().__init__(
             hass,
             _LOGGER,
             config_entry=config_entry,
-            name="Swiftly IS Straeto Data Coordinator",
+            name=name,
             update_interval=timedelta(seconds=DEFAULT_UPDATE_TIME),
+            always_update=False,
+        )
+
+    async def _async_setup(self) -> None:
+        """Use the agency time zone for service hours."""
+        try:
+            info = await self.api_client.get_agency_info()
+        except Exception as err:  # noqa: BLE001
+            _LOGGER.debug("Could not fetch agency info, using local time: %s", err)
+            return
+        if time_zone := dt_util.get_time_zone(info.get("timezone", "")):
+            self.polling_schedule.time_zone = time_zone
+
+    @callback
+    def async_set_plan(self, plan: PollingPlan) -> bool:
+        """Poll according to a new plan and return True if it changed."""
+        if plan == self.plan:
+            return False
+        self.plan = plan
+        # Models hold subentry IDs, so none of them can be reused, and the next
+        # responses are needed even if they did not change.
+        self._tracker.clear()
+        self._reset_models()
+        self._replanned = True
+        return True
+
+    def _reset_models(self) -> None:
+        """Forget models built for a previous plan."""
+
+    @abstractmethod
+    async def _async_fetch(self) -> CoordinatorData[KeyT, ItemT]:
+        """Fetch and publish the items of this pipeline.
+
+        Returns the current data itself when there was nothing to fetch.
+        """
+
+    async def _async_update_data(self) -> CoordinatorData[KeyT, ItemT]:
+        """Fetch the items, or serve the last snapshot while the API is down."""
+        try:
+            data = await self._async_fetch()
+        except OUTAGE_ERRORS as err:
+            if self.data is None or self._fetched_at is None:
+                raise UpdateFailed(f"Swiftly API unavailable: {err}") from err
+            if retry_in := self.api_client.circuit_breaker.retry_in:
+                self._schedule_next(timedelta(seconds=retry_in))
+            if self.data.stale_since is not None:
+                return self.data
+            _LOGGER.warning(
+                "Swiftly API unavailable, serving %s from %s: %s",
+                self.name,
+                self._fetched_at,
+                err,
+            )
+            # Every entity shows its staleness.
+            self.delta = SnapshotDelta(changed=frozenset(self.data.index))
+            return self.data.as_stale(self._fetched_at)
+        if data is self.data:
+            # Nothing was fetched, so the data is as old, and as stale, as before.
+            return data
+        if self.data is not None and self.data.stale_since is not None:
+            _LOGGER.info("Swiftly API available again, updating %s", self.name)
+        self._fetched_at = dt_util.utcnow()
+        return data
+
+    @staticmethod
+    @abstractmethod
+    def _key(item: ItemT) -> KeyT:
+        """Return the key entities use to look up an item."""
+
+    def _publish(
+        self, items: list[ItemT], touched: Iterable[KeyT] = ()
+    ) -> CoordinatorData[KeyT, ItemT]:
+        """Index the items and record what changed since the previous refresh.
+
+        :param touched: Keys whose entities need to update even if their items
+            did not change.
+        """
+        data = CoordinatorData(items, self._key)
+        delta = SnapshotDelta.between(
+            self.data.index if self.data is not None else {}, data.index
+        )
+        if self.data is not None and self.data.stale_since is not None:
+            # Entities of unchanged items stop showing their staleness.
+            touched = self.data.index.keys() | frozenset(touched)
+        if touched := frozenset(touched) & data.index.keys():
+            delta = replace(delta, changed=delta.changed | touched)
+        if self._replanned:
+            # Items may belong to another subentry now, so their entities may
+            # be new as well.
+            self._replanned = False
+            delta = SnapshotDelta(added=frozenset(data.index), removed=delta.removed)
+        if expired := self._expire(data):
+            data.expired = expired
+            delta = replace(delta, expired=expired)
+        self.delta = delta
+        return data
+
+    def _expire(self, data: CoordinatorData[KeyT, ItemT]) -> frozenset[KeyT]:
+        """Return the keys whose entities should be removed after this refresh."""
+        return frozenset()
+
+    def added_items(self) -> list[ItemT]:
+        """Return the items whose keys were added in the last refresh."""
+        index = self.data.index
+        return [index[key] for key in self.delta.added if key in index]
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Update the listeners whose items changed in the last refresh."""
+        if self.last_update_success != self._notified_success:
+            # Availability changed, so every entity needs to update.
+            self._notified_success = self.last_update_success
+            super().async_update_listeners()
+            return
+        keys = self.delta.keys
+        for update_callback, context in list(self._listeners.values()):
+            if context is None or context in keys:
+                update_callback()
+
+    def _min_update_interval(self) -> timedelta:
+        """Return the shortest interval the rate limit can sustain.
+
+        Assumes both pipelines poll at this pace, as they share the quota. When
+        the budget left is too small for a refresh, or the API asked to pause,
+        the interval is stretched until the tokens for a refresh are available.
+        """
+        requests = self.plan.requests_per_refresh(self.api_client.multi_stop_supported)
+        rate_limiter = self.api_client.rate_limiter
+        sustainable = requests * rate_limiter.period / rate_limiter.limit
+        replenish = (
+            rate_limiter.paused_for
+            + max(0, requests - rate_limiter.remaining) / rate_limiter.rate
+        )
+        return timedelta(seconds=max(sustainable, replenish))
+
+    def _schedule_next(self, interval: timedelta) -> None:
+        """Set the interval until the next refresh of this pipeline."""
+        self.update_interval = max(interval, self._min_update_interval())
+
+
+class SwiftlyIsStraetoVehicleCoordinator(
+    SwiftlyIsStraetoDataUpdateCoordinator[str, Vehicle]
+):
+    """Refresh vehicle positions on monitored routes, keyed by block ID.
+
+    Alongside the vehicle models, a columnar FleetSnapshot of the same vehicles
+    is kept for fleet wide calculations, such as the schedule adherence of each
+    route used by the route sensors, and the vehicles are tracked along their
+    route shapes to estimate their positions between polls, see DeadReckoning.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        config_entry: SwiftlyIsStraetoConfigEntry,
+        api_client: SwiftlyAPIClient,
+        polling_schedule: PollingSchedule,
+        plan: PollingPlan,
+    ) -> None:
+        """Initialize the vehicle coordinator."""
+        self._vehicles: list[Vehicle] = []
+        self._last_seen: dict[str, datetime] = {}
+        self.fleet = FleetSnapshot()
+        self.route_adherence: dict[str, AdherenceStats] = {}
+        self.dead_reckoning = DeadReckoning()
+        super().__init__(
+            hass,
+            config_entry,
+            api_client,
+            polling_schedule,
+            plan,
+            "Swiftly IS Straeto Vehicle Coordinator",
+        )
+
+    def _reset_models(self) -> None:
+        """Forget vehicle models built for a previous mapping."""
+        self._vehicles = []
+        self._set_fleet()
+
+    def _set_fleet(self) -> None:
+        """Rebuild the fleet snapshot and route statistics from the vehicles."""
+        self.fleet = FleetSnapshot(self._vehicles)
+        self.route_adherence = self.fleet.route_adherence()
+
+    @staticmethod
+    def _key(item: Vehicle) -> str:
+        """Return the block ID of a vehicle."""
+        return item.block_id
+
+    def _expire(self, data: CoordinatorData[str, Vehicle]) -> frozenset[str]:
+        """Return the block IDs that have been missing for longer than the TTL."""
+        now = dt_util.utcnow()
+        for block_id in data.index:
+            self._last_seen[block_id] = now
+        ttl = timedelta(
+            minutes=self.config_entry.options.get(CONF_VEHICLE_TTL, DEFAULT_VEHICLE_TTL)
+        )
+        expired = frozenset(
+            block_id
+            for block_id, last_seen in self._last_seen.items()
+            if now - last_seen > ttl
+        )
+        for block_id in expired:
+            del self._last_seen[block_id]
+        return expired
+
+    async def _get_vehicles(self) -> list[Vehicle]:
+        """Fetch vehicles on monitored routes, reusing models if nothing changed."""
+        payload = await self.api_client.get_vehicles(
+            route=list(self.plan.routes),
+            verbose=VERBOSE_VEHICLES,
+            tracker=self._tracker,
         )
+        if payload is not UNCHANGED:
+            subentries = self.plan.vehicle_subentries
+            self._vehicles = [
+                Vehicle.from_json(vehicle, subentries.get(vehicle["routeId"]))
+                for vehicle in payload.get(JSON_VEHICLES, [])
+            ]
+            self._set_fleet()
+        return self._vehicles
+
+    async def _async_fetch(self) -> CoordinatorData[str, Vehicle]:
+        """Fetch vehicles on monitored routes.
+
+        The next update is scheduled from the fetched data, see PollingSchedule.
+        """
+        vehicles = await self._get_vehicles() if self.plan.routes else []
+        self._schedule_next(
+            self.polling_schedule.vehicle_interval(vehicles, dt_util.utcnow())
+        )
+        if self.config_entry.options.get(
+            CONF_TRACKER_INTERVAL, DEFAULT_TRACKER_INTERVAL
+        ):
+            await self._async_load_shapes()
+            self.dead_reckoning.update(vehicles)
+        return self._publish(vehicles)
+
+    async def _async_load_shapes(self) -> None:
+        """Load the shapes of monitored routes from the route cache.
+
+        Routes whose shapes cannot be loaded are tracked without snapping until
+        the integration is reloaded, so a failing lookup does not cost a
+        request on every poll.
+        """
+        route_cache = async_get_route_cache(self.hass)
+        for route_id in self.plan.routes:
+            if route_id in self.dead_reckoning.shapes:
+                continue
+            try:
+                route = await route_cache.async_get_route(self.api_client, route_id)
+            except Exception as err:  # noqa: BLE001
+                _LOGGER.debug("Could not load shapes of route %s: %s", route_id, err)
+                route = None
+            self.dead_reckoning.set_shapes(
+                route_id, (route.get("shapes") or []) if route else []
+            )
 
-    async def _get_stop_predictions(
-        self, stops: dict[str, list[str]], route_subentry_mapping: dict[str, str]
-    ) -> list[Prediction]:
-        """Fetch predictions for monitored stops."""
-        predictions: list[Prediction] = []
-        for stop, routes in stops.items():
-            prediction = await self.api_client.get_predictions(stop, routes)
-            prediction_data = prediction.get(JSON_PREDICTIONS_DATA, [])
-            for item in prediction_data:
-                predictions.extend([Prediction(item, route_subentry_mapping)])
-        return predictions
-
-    async def _async_update_data(self) -> CoordinatorData:
-        """Fetch vehicle and prediction data for monitored routes and stops every DEFAULT_UPDATE_TIME seconds."""
-        routes, stops, route_subentry_mapping = get_subentry_data(self.config_entry)
-
-        vehicles = (
-            await self.api_client.get_vehicles(route=routes, verbose=True)
-            if routes
-            else {}
+
+@dataclass(slots=True)
+class StopState:
+    """Last good predictions of a stop, and its failures since."""
+
+    predictions: list[Prediction] = field(default_factory=list)
+    updated: datetime | None = None
+    failures: int = 0
+    retry_at: datetime | None = None
+
+    def due(self, now: datetime) -> bool:
+        """Return whether the stop should be fetched now."""
+        return self.retry_at is None or self.retry_at <= now
+
+
+class SwiftlyIsStraetoPredictionCoordinator(
+    SwiftlyIsStraetoDataUpdateCoordinator[tuple[str, str], Prediction]
+):
+    """Refresh arrival predictions for monitored stops, keyed by stop and route.
+
+    Between refreshes, the countdown to the next arrival at each stop is
+    extrapolated locally, see ArrivalCountdown.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        config_entry: SwiftlyIsStraetoConfigEntry,
+        api_client: SwiftlyAPIClient,
+        polling_schedule: PollingSchedule,
+        plan: PollingPlan,
+    ) -> None:
+        """Initialize the prediction coordinator."""
+        self._stops: dict[str, StopState] = {}
+        # Countdown to the next arrival, by stop and route
+        self.countdowns: dict[tuple[str, str], ArrivalCountdown] = {}
+        super().__init__(
+            hass,
+            config_entry,
+            api_client,
+            polling_schedule,
+            plan,
+            "Swiftly IS Straeto Prediction Coordinator",
         )
-        predictions = (
-            await self._get_stop_predictions(stops, route_subentry_mapping)
-            if stops
-            else []
+
+    def _reset_models(self) -> None:
+        """Forget prediction models built for a previous mapping."""
+        self._stops = {}
+
+    @staticmethod
+    def _key(item: Prediction) -> tuple[str, str]:
+        """Return the stop and route of a prediction."""
+        return item.key
+
+    def stale_since(self, stop_id: str) -> datetime | None:
+        """Return when a failing stop last had good predictions.
+
+        While the whole snapshot is served stale, every stop is stale since it
+        was fetched, or since its own failures started if that was earlier.
+        """
+        stale_since = self.data.stale_since if self.data is not None else None
+        if (state := self._stops.get(stop_id)) is None or not state.failures:
+            return stale_since
+        if stale_since is None or state.updated is None:
+            return state.updated
+        return min(stale_since, state.updated)
+
+    async def _get_stop_predictions(self) -> tuple[list[Prediction], set[str]]:
+        """Fetch predictions for monitored stops, reusing models of unchanged stops.
+
+        Stops that fail keep their last good predictions and are retried on their
+        own backoff schedule, while the other stops are fetched as usual.
+
+        Returns the predictions and the stops that started or stopped failing.
+        """
+        now = dt_util.utcnow()
+        plan = self.plan
+        stops = {stop_id: self._stops.get(stop_id) for stop_id in plan.stops}
+        due = {
+            stop_id: plan.stops[stop_id]
+            for stop_id, state in stops.items()
+            if state is None or state.due(now)
+        }
+        options = self.config_entry.options
+        number = options.get(CONF_ARRIVALS, DEFAULT_ARRIVALS)
+        errors: dict[str, Exception] = {}
+        responses = await self.api_client.get_predictions_for_stops(
+            due,
+            max_concurrent=options.get(
+                CONF_MAX_CONCURRENT_REQUESTS, DEFAULT_MAX_CONCURRENT_REQUESTS
+            ),
+            timeout=options.get(CONF_REQUEST_TIMEOUT, DEFAULT_REQUEST_TIMEOUT),
+            number=number,
+            batches=plan.stop_batches if len(due) == len(stops) else None,
+            errors=errors,
+            tracker=self._tracker,
         )
+        subentries = plan.prediction_subentries
+        flipped: set[str] = set()
+        for stop_id, items in responses.items():
+            state = stops[stop_id] or StopState()
+            if state.failures:
+                flipped.add(stop_id)
+                state.failures = 0
+                state.retry_at = None
+            if items is not UNCHANGED:
+                state.predictions = [
+                    Prediction.from_json(
+                        item,
+                        subentries.get((item["stopId"], item["routeId"])),
+                        number,
+                    )
+                    for item in items
+                ]
+            state.updated = now
+            stops[stop_id] = state
+        for stop_id, err in errors.items():
+            state = stops[stop_id] or StopState()
+            if not state.failures:
+                flipped.add(stop_id)
+            state.failures += 1
+            state.retry_at = now + timedelta(
+                seconds=backoff_delay(
+                    state.failures, DEFAULT_UPDATE_TIME, MAX_STOP_RETRY_TIME
+                )
+            )
+            _LOGGER.debug(
+                "Predictions for stop %s failed %s times, retrying at %s: %s",
+                stop_id,
+                state.failures,
+                state.retry_at,
+                err,
+            )
+            stops[stop_id] = state
+        self._stops = {
+            stop_id: state for stop_id, state in stops.items() if state is not None
+        }
+        if errors and len(errors) == len(due):
+            if isinstance(err := next(iter(errors.values())), OUTAGE_ERRORS):
+                raise err
+            raise UpdateFailed(f"Predictions failed for all {len(errors)} stops: {err}")
+        return [
+            prediction
+            for state in self._stops.values()
+            for prediction in state.predictions
+        ], flipped
 
-        return CoordinatorData(
-            vehicles=[
-                Vehicle(vehicle, route_subentry_mapping)
-                for vehicle in vehicles.get(JSON_VEHICLES, [])
-            ],
-            predictions=predictions,
+    async def _async_fetch(self) -> CoordinatorData[tuple[str, str], Prediction]:
+        """Fetch predictions for monitored stops.
+
+        The next update is scheduled from the fetched data, see PollingSchedule.
+        While every stop is backing off, nothing is fetched and the next update
+        is scheduled for the first retry.
+        """
+        now = dt_util.utcnow()
+        retries = [
+            state.retry_at
+            for stop_id in self.plan.stops
+            if (state := self._stops.get(stop_id)) is not None and not state.due(now)
+        ]
+        if self.data is not None and retries and len(retries) == len(self.plan.stops):
+            self._schedule_next(min(retries) - now)
+            self.delta = SnapshotDelta()
+            return self.data
+        predictions, flipped = (
+            await self._get_stop_predictions() if self.plan.stops else ([], set())
+        )
+        self._schedule_next(
+            self.polling_schedule.prediction_interval(predictions, dt_util.utcnow())
         )
+        countdowns: dict[tuple[str, str], ArrivalCountdown] = {}
+        for prediction in predictions:
+            if (key := prediction.key) in countdowns:
+                continue
+            countdown = countdowns[key] = self.countdowns.get(key) or ArrivalCountdown()
+            countdown.observe(prediction.next_arrival)
+        self.countdowns = countdowns
+        # Entities of stops that started or stopped failing show their staleness.
+        return self._publish(
+            predictions,
+            (
+                prediction.key
+                for stop_id in flipped
+                for prediction in self._stops[stop_id].predictions
+            ),
+        )
+
+
+@dataclass
+class SwiftlyIsStraetoData:
+    """Runtime data for a Swiftly IS Straeto config entry."""
+
+    vehicles: SwiftlyIsStraetoVehicleCoordinator
+    predictions: SwiftlyIsStraetoPredictionCoordinator
+    polling_schedule: PollingSchedule
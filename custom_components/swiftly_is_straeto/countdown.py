@@ -0,0 +1,82 @@
+"""Countdown to a predicted arrival, extrapolated between polls."""
+
+import time
+
+from homeassistant.util import dt as dt_util
+
+from .const import DRIFT_SMOOTHING, MAX_DRIFT
+from .models import Arrival
+
+
+class ArrivalCountdown:
+    """Extrapolate the time until the next arrival at a stop between polls.
+
+    The remaining time counts down on the local monotonic clock from the
+    seconds until arrival the API reported, so a skewed local clock does not
+    shift it. When consecutive polls move the predicted arrival of the same
+    trip, the rate it moved at is smoothed into a drift that slows or speeds up
+    the countdown, so a vehicle that keeps falling behind does not count down
+    to zero before it arrives.
+    """
+
+    __slots__ = ("_arrival", "_observed_at", "_seconds", "drift")
+
+    def __init__(self) -> None:
+        """Initialize the countdown without an arrival."""
+        self._arrival: Arrival | None = None
+        self._observed_at = 0.0
+        self._seconds = 0.0
+        # Seconds the arrival moves later per second, between -MAX_DRIFT and MAX_DRIFT
+        self.drift = 0.0
+
+    def observe(self, arrival: Arrival | None, now: float | None = None) -> None:
+        """Restart the countdown from a polled arrival.
+
+        The same arrival object is returned again while the API data is
+        unchanged, and is ignored so the countdown keeps running.
+
+        :param now: Monotonic time of the poll. Defaults to the current time.
+        """
+        if arrival is self._arrival:
+            return
+        if arrival is None:
+            self._arrival = None
+            self.drift = 0.0
+            return
+        now = time.monotonic() if now is None else now
+        previous = self._arrival
+        if (
+            previous is not None
+            and previous.trip_id == arrival.trip_id
+            and now > self._observed_at
+        ):
+            moved = (arrival.time - previous.time).total_seconds()
+            sample = min(max(moved / (now - self._observed_at), -MAX_DRIFT), MAX_DRIFT)
+            self.drift += DRIFT_SMOOTHING * (sample - self.drift)
+        else:
+            # Another vehicle is next, so the drift of the previous one is useless.
+            self.drift = 0.0
+        self._arrival = arrival
+        self._observed_at = now
+        self._seconds = float(
+            arrival.seconds
+            if arrival.seconds is not None
+            else (arrival.time - dt_util.utcnow()).total_seconds()
+        )
+
+    def remaining(self, now: float | None = None) -> float | None:
+        """Return the extrapolated seconds until arrival, None without an arrival.
+
+        :param now: Monotonic time to extrapolate to. Defaults to the current time.
+        """
+        if self._arrival is None:
+            return None
+        now = time.monotonic() if now is None else now
+        elapsed = now - self._observed_at
+        return max(0.0, self._seconds - (1 - self.drift) * elapsed)
+
+    def minutes(self, now: float | None = None) -> int | None:
+        """Return the whole minutes until arrival, None without an arrival."""
+        if (remaining := self.remaining(now)) is None:
+            return None
+        return int(remaining // 60)
@@ -0,0 +1,269 @@
+"""Dead reckoning of vehicle positions between polls."""
+
+from bisect import bisect_right
+from collections.abc import Iterable
+import math
+
+from .api import JSONShape
+from .const import MAX_DEAD_RECKONING, MAX_SNAP_DISTANCE, SNAP_WINDOW
+from .models import Vehicle
+
+# Meters per degree of latitude
+METERS_PER_DEGREE = 111_195.0
+# Size of the grid cells indexing shape segments, at least MAX_SNAP_DISTANCE
+CELL_SIZE = 2 * MAX_SNAP_DISTANCE
+
+
+class RouteShape:
+    """Polyline of a route pattern, projected to meters for snapping.
+
+    Points are projected onto a flat plane around the first point of the shape,
+    which is accurate to well under a meter over the extent of a city. Segments
+    are indexed in a grid, so snapping a position without a previous segment
+    only looks at the segments in the cells around it.
+    """
+
+    __slots__ = (
+        "_cells",
+        "_cos_lat",
+        "_lat0",
+        "_lon0",
+        "distances",
+        "headsign",
+        "x",
+        "y",
+    )
+
+    def __init__(self, shape: JSONShape) -> None:
+        """Initialize the shape from route data."""
+        locs = shape.get("locs") or []
+        self.headsign = shape.get("headsign", "")
+        self._lat0 = locs[0]["lat"] if locs else 0.0
+        self._lon0 = locs[0]["lon"] if locs else 0.0
+        self._cos_lat = math.cos(math.radians(self._lat0))
+        self.x: list[float] = []
+        self.y: list[float] = []
+        # Distance along the shape to each point, in meters
+        self.distances: list[float] = []
+        total = 0.0
+        for loc in locs:
+            x, y = self.project(loc["lat"], loc["lon"])
+            if self.x:
+                total += math.hypot(x - self.x[-1], y - self.y[-1])
+            self.x.append(x)
+            self.y.append(y)
+            self.distances.append(total)
+        # Segments crossing the bounding box of each cell
+        self._cells: dict[tuple[int, int], list[int]] = {}
+        for index in range(len(self.x) - 1):
+            x1, x2 = sorted((self.x[index], self.x[index + 1]))
+            y1, y2 = sorted((self.y[index], self.y[index + 1]))
+            for cell_x in range(int(x1 // CELL_SIZE), int(x2 // CELL_SIZE) + 1):
+                for cell_y in range(int(y1 // CELL_SIZE), int(y2 // CELL_SIZE) + 1):
+                    self._cells.setdefault((cell_x, cell_y), []).append(index)
+
+    def __len__(self) -> int:
+        """Return the number of points."""
+        return len(self.x)
+
+    def project(self, latitude: float, longitude: float) -> tuple[float, float]:
+        """Return a position in meters east and north of the first point."""
+        return (
+            (longitude - self._lon0) * METERS_PER_DEGREE * self._cos_lat,
+            (latitude - self._lat0) * METERS_PER_DEGREE,
+        )
+
+    def unproject(self, x: float, y: float) -> tuple[float, float]:
+        """Return the latitude and longitude of a projected position."""
+        return (
+            self._lat0 + y / METERS_PER_DEGREE,
+            self._lon0 + x / (METERS_PER_DEGREE * self._cos_lat),
+        )
+
+    def snap(
+        self, x: float, y: float, heading: float | None, near: int | None = None
+    ) -> tuple[float, float, int] | None:
+        """Return the closest point on the shape to a projected position.
+
+        The result is the distance along the shape, the distance from the
+        position and the segment index, or None if no segment is within
+        MAX_SNAP_DISTANCE. Segments pointing more than 90 degrees away from the
+        heading are skipped, and only the SNAP_WINDOW segments on either side
+        of near are searched when it is given.
+        """
+        indices: Iterable[int]
+        if near is not None:
+            indices = range(
+                max(0, near - SNAP_WINDOW),
+                min(len(self.x) - 1, near + SNAP_WINDOW + 1),
+            )
+        else:
+            cell_x, cell_y = int(x // CELL_SIZE), int(y // CELL_SIZE)
+            indices = sorted(
+                {
+                    index
+                    for dx in (-1, 0, 1)
+                    for dy in (-1, 0, 1)
+                    for index in self._cells.get((cell_x + dx, cell_y + dy), ())
+                }
+            )
+        if heading is not None:
+            heading_x = math.sin(math.radians(heading))
+            heading_y = math.cos(math.radians(heading))
+        best: tuple[float, float, int] | None = None
+        xs, ys = self.x, self.y
+        for index in indices:
+            x1, y1 = xs[index], ys[index]
+            dx, dy = xs[index + 1] - x1, ys[index + 1] - y1
+            length2 = dx * dx + dy * dy
+            if not length2:
+                continue
+            if heading is not None and dx * heading_x + dy * heading_y < 0:
+                continue
+            part = min(1.0, max(0.0, ((x - x1) * dx + (y - y1) * dy) / length2))
+            offset = math.hypot(x - x1 - part * dx, y - y1 - part * dy)
+            if offset <= MAX_SNAP_DISTANCE and (best is None or offset < best[1]):
+                along = self.distances[index] + part * math.sqrt(length2)
+                best = (along, offset, index)
+        return best
+
+    def point_at(self, distance: float) -> tuple[float, float]:
+        """Return the position a distance along the shape, stopping at its end."""
+        distances = self.distances
+        if distance >= distances[-1]:
+            return self.unproject(self.x[-1], self.y[-1])
+        index = max(0, bisect_right(distances, distance) - 1)
+        length = distances[index + 1] - distances[index]
+        part = (distance - distances[index]) / length if length else 0.0
+        return self.unproject(
+            self.x[index] + part * (self.x[index + 1] - self.x[index]),
+            self.y[index] + part * (self.y[index + 1] - self.y[index]),
+        )
+
+
+class VehicleTrack:
+    """Last reported position of a vehicle, and where it is on its route shape."""
+
+    __slots__ = ("distance", "segment", "shape", "vehicle")
+
+    def __init__(
+        self,
+        vehicle: Vehicle,
+        shape: RouteShape | None = None,
+        distance: float = 0.0,
+        segment: int = 0,
+    ) -> None:
+        """Initialize the track.
+
+        :param shape: Shape the vehicle was snapped to, if any.
+        :param distance: Distance along the shape of the reported position.
+        :param segment: Segment of the shape the vehicle was snapped to.
+        """
+        self.vehicle = vehicle
+        self.shape = shape
+        self.distance = distance
+        self.segment = segment
+
+    def position(self, now: float) -> tuple[float, float] | None:
+        """Return the estimated position at a time, in epoch seconds.
+
+        The vehicle moves at its reported speed for at most MAX_DEAD_RECKONING
+        seconds after its location time, along the shape if it was snapped to
+        one and along its heading otherwise.
+        """
+        vehicle = self.vehicle
+        if vehicle.latitude is None or vehicle.longitude is None:
+            return None
+        if not vehicle.speed or vehicle.location_time is None:
+            return vehicle.latitude, vehicle.longitude
+        elapsed = min(max(0.0, now - vehicle.location_time), MAX_DEAD_RECKONING)
+        travelled = vehicle.speed * elapsed
+        if self.shape is not None:
+            return self.shape.point_at(self.distance + travelled)
+        if vehicle.heading is None:
+            return vehicle.latitude, vehicle.longitude
+        heading = math.radians(vehicle.heading)
+        return (
+            vehicle.latitude + travelled * math.cos(heading) / METERS_PER_DEGREE,
+            vehicle.longitude
+            + travelled
+            * math.sin(heading)
+            / (METERS_PER_DEGREE * math.cos(math.radians(vehicle.latitude))),
+        )
+
+
+class DeadReckoning:
+    """Estimate vehicle positions between polls.
+
+    Each reported position is snapped to the closest shape of the vehicle's
+    route, preferring shapes with the vehicle's headsign, and is then moved
+    along the shape at the reported speed. Vehicles without a shape close by
+    move along their heading instead. A vehicle already on a shape is only
+    searched for near its previous segment, other vehicles only in the grid
+    cells around them, and estimating a position is a binary search over the
+    shape, so the cost per vehicle stays bounded.
+    """
+
+    def __init__(self) -> None:
+        """Initialize dead reckoning without shapes."""
+        self.shapes: dict[str, list[RouteShape]] = {}
+        self.tracks: dict[str, VehicleTrack] = {}
+
+    def set_shapes(self, route_id: str, shapes: Iterable[JSONShape]) -> None:
+        """Set the shapes of a route."""
+        self.shapes[route_id] = [
+            route_shape
+            for route_shape in map(RouteShape, shapes)
+            if len(route_shape) > 1
+        ]
+
+    def update(self, vehicles: Iterable[Vehicle]) -> None:
+        """Track the vehicles of a poll, keeping tracks of unchanged vehicles."""
+        tracks: dict[str, VehicleTrack] = {}
+        for vehicle in vehicles:
+            if vehicle.block_id in tracks:
+                continue
+            previous = self.tracks.get(vehicle.block_id)
+            if previous is not None and previous.vehicle is vehicle:
+                tracks[vehicle.block_id] = previous
+            else:
+                tracks[vehicle.block_id] = self._track(vehicle, previous)
+        self.tracks = tracks
+
+    def position(self, block_id: str, now: float) -> tuple[float, float] | None:
+        """Return the estimated position of a vehicle at a time, in epoch seconds."""
+        if (track := self.tracks.get(block_id)) is None:
+            return None
+        return track.position(now)
+
+    def _track(self, vehicle: Vehicle, previous: VehicleTrack | None) -> VehicleTrack:
+        """Snap a reported position to the closest shape of its route."""
+        if (
+            vehicle.latitude is None
+            or vehicle.longitude is None
+            or not (shapes := self.shapes.get(vehicle.route_id))
+        ):
+            return VehicleTrack(vehicle)
+        candidates = [
+            shape for shape in shapes if shape.headsign == vehicle.headsign
+        ] or shapes
+        if previous is not None and previous.shape in candidates:
+            shape = previous.shape
+            snapped = shape.snap(
+                *shape.project(vehicle.latitude, vehicle.longitude),
+                vehicle.heading,
+                previous.segment,
+            )
+            if snapped is not None:
+                return VehicleTrack(vehicle, shape, snapped[0], snapped[2])
+        best: tuple[RouteShape, tuple[float, float, int]] | None = None
+        for shape in candidates:
+            snapped = shape.snap(
+                *shape.project(vehicle.latitude, vehicle.longitude), vehicle.heading
+            )
+            if snapped is not None and (best is None or snapped[1] < best[1][1]):
+                best = (shape, snapped)
+        if best is None:
+            return VehicleTrack(vehicle)
+        shape, (distance, _, segment) = best
+        return VehicleTrack(vehicle, shape, distance, segment)
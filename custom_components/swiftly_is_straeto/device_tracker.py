@@ -1,17 +1,29 @@
 """Device tracker platform for swiftly_is_straeto."""
 
-from homeassistant.components.device_tracker import TrackerEntity
-from homeassistant.components.sensor import SensorEntity
-from homeassistant.core import HomeAssistant
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+import time
+
+from homeassistant.components.device_tracker import (
+    DOMAIN as DEVICE_TRACKER_DOMAIN,
+    TrackerEntity,
+)
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddConfigEntryEntitiesCallback
+from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
-from .const import ATTR_DIRECTION, JSON_VEHICLES
+from .const import (
+    ATTR_DIRECTION,
+    ATTR_STALE_SINCE,
+    CONF_TRACKER_INTERVAL,
+    DEFAULT_TRACKER_INTERVAL,
+)
 from .coordinator import (
     SwiftlyIsStraetoConfigEntry,
-    SwiftlyIsStraetoDataUpdateCoordinator,
+    SwiftlyIsStraetoVehicleCoordinator,
 )
-from .entity import SwiftlyIsStraetoBaseEntity
+from .entity import KnownVehicles, SwiftlyIsStraetoBaseEntity
 from .models import Vehicle
 
 
@@ -22,38 +34,44 @@ async def async_setup_entry(
 ) -> None:
     """Set up the swiftly_is_straeto device tracker."""
 
-    coordinator = config_entry.runtime_data
-    vehicles = coordinator.data.get("vehicles", [])
+    coordinator = config_entry.runtime_data.vehicles
+    known_vehicles = KnownVehicles(
+        hass, config_entry, DEVICE_TRACKER_DOMAIN, ["tracker"]
+    )
 
-    subentry_map: dict[str, list[SensorEntity]] = {}
-    for vehicle in vehicles:
-        subentry_map.setdefault(vehicle.subentry_id, []).append(
-            SwiftlyIsStraetoDeviceTracker(coordinator, vehicle)
-        )
-    for subentry_id, entities in subentry_map.items():
-        async_add_entities(entities, config_subentry_id=subentry_id)
+    def _add_trackers(vehicles: Iterable[Vehicle]) -> None:
+        """Add trackers for vehicles that do not have one yet."""
+        new_entities: dict[str | None, list[TrackerEntity]] = {}
+        for vehicle in vehicles:
+            if not known_vehicles.add(vehicle):
+                continue
+            new_entities.setdefault(vehicle.subentry_id, []).append(
+                SwiftlyIsStraetoDeviceTracker(coordinator, vehicle)
+            )
+        for subentry_id, entities in new_entities.items():
+            async_add_entities(entities, config_subentry_id=subentry_id)
+
+    _add_trackers(coordinator.data)
 
     def _update_entities() -> None:
-        """Add new device trackers when new vehicles appear."""
-        vehicles = coordinator.data.get("vehicles", [])
-        known_ids = {
-            e.unique_id for entity_list in subentry_map.values() for e in entity_list
-        }
-        for vehicle in vehicles:
-            if vehicle.get_unique_id("tracker") not in known_ids:
-                tracker = SwiftlyIsStraetoDeviceTracker(coordinator, vehicle)
-                subentry_map.setdefault(vehicle.subentry_id, []).append(tracker)
-                async_add_entities([tracker], config_subentry_id=vehicle.subentry_id)
+        """Add trackers for new vehicles and remove those of departed ones."""
+        known_vehicles.async_evict(coordinator.delta.expired)
+        _add_trackers(coordinator.added_items())
 
+    config_entry.async_on_unload(known_vehicles.async_evict_orphans())
     config_entry.async_on_unload(coordinator.async_add_listener(_update_entities))
 
 
 class SwiftlyIsStraetoDeviceTracker(
-    CoordinatorEntity[SwiftlyIsStraetoDataUpdateCoordinator],
+    CoordinatorEntity[SwiftlyIsStraetoVehicleCoordinator],
     SwiftlyIsStraetoBaseEntity,
     TrackerEntity,
 ):
-    """Device tracker entity for swiftly_is_straeto vehicles."""
+    """Device tracker entity for swiftly_is_straeto vehicles.
+
+    Between polls the position is moved forward on a local timer, see
+    DeadReckoning, and the state is only written when the position changed.
+    """
 
     _attr_force_update = False
     _attr_translation_key = "vehicle"
@@ -62,11 +80,12 @@ class SwiftlyIsStraetoDeviceTracker(
 
     def __init__(
         self,
-        coordinator: SwiftlyIsStraetoDataUpdateCoordinator,
+        coordinator: SwiftlyIsStraetoVehicleCoordinator,
         vehicle: Vehicle,
     ) -> None:
         """Initialize the Tracker."""
-        super().__init__(coordinator)
+        # Only updated when this vehicle changes, see the coordinator delta.
+        super().__init__(coordinator, context=vehicle.block_id)
         SwiftlyIsStraetoBaseEntity.__init__(
             self,
             vehicle.route_id,
@@ -74,39 +93,90 @@ class SwiftlyIsStraetoDeviceTracker(
         )
         self._attr_unique_id = vehicle.get_unique_id("tracker")
         self.block_id = vehicle.block_id
+        self._vehicle: Vehicle | None = vehicle
         self._attr_name = f"{vehicle.block_id}"
+        self._tick_interval = 0
+        self._cancel_ticks: CALLBACK_TYPE | None = None
+        self._position = self._estimate_position()
+
+    async def async_added_to_hass(self) -> None:
+        """Start moving the vehicle between polls when added to hass."""
+        await super().async_added_to_hass()
+        self._schedule_ticks()
+        self.async_on_remove(self._cancel_scheduled_ticks)
+
+    @callback
+    def _schedule_ticks(self) -> None:
+        """Follow the configured tracker interval, 0 turning dead reckoning off."""
+        interval = self.coordinator.config_entry.options.get(
+            CONF_TRACKER_INTERVAL, DEFAULT_TRACKER_INTERVAL
+        )
+        if interval == self._tick_interval:
+            return
+        self._cancel_scheduled_ticks()
+        self._tick_interval = interval
+        if interval:
+            self._cancel_ticks = async_track_time_interval(
+                self.hass, self._tick, timedelta(seconds=interval)
+            )
+
+    @callback
+    def _cancel_scheduled_ticks(self) -> None:
+        """Stop moving the vehicle between polls."""
+        if self._cancel_ticks is not None:
+            self._cancel_ticks()
+            self._cancel_ticks = None
+
+    def _estimate_position(self) -> tuple[float, float] | None:
+        """Return the current position, estimated if dead reckoning is on."""
+        if self.vehicle is None:
+            return None
+        if self._tick_interval and (
+            position := self.coordinator.dead_reckoning.position(
+                self.block_id, time.time()
+            )
+        ):
+            return position
+        if self.vehicle.latitude is None or self.vehicle.longitude is None:
+            return None
+        return self.vehicle.latitude, self.vehicle.longitude
+
+    @callback
+    def _tick(self, _now: datetime) -> None:
+        """Write the state if the estimated position moved."""
+        if (position := self._estimate_position()) != self._position:
+            self._position = position
+            self.async_write_ha_state()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Resolve the vehicle once for every property read while writing state."""
+        self._vehicle = self.coordinator.data.get(self.block_id)
+        self._schedule_ticks()
+        self._position = self._estimate_position()
+        super()._handle_coordinator_update()
 
     @property
     def vehicle(self) -> Vehicle | None:
         """Return the vehicle data for this sensor."""
-        for v in self.coordinator.data.get(JSON_VEHICLES, []):
-            if v.block_id == self.block_id:
-                return v
-        return None
+        return self._vehicle
 
     @property
-    def extra_state_attributes(self) -> dict[str, str | int | float | None]:
+    def extra_state_attributes(
+        self,
+    ) -> dict[str, str | int | float | datetime | None]:
         """Return the state attributes."""
-        return {
-            ATTR_DIRECTION: self.vehicle.location["heading"]
-            if self.vehicle and self.vehicle.location
-            else None
-        }
+        attributes = {ATTR_DIRECTION: self.vehicle.heading if self.vehicle else None}
+        if (stale_since := self.coordinator.data.stale_since) is not None:
+            attributes[ATTR_STALE_SINCE] = stale_since
+        return attributes
 
     @property
     def latitude(self) -> float | None:
         """Return the latitude of the vehicle."""
-        return (
-            self.vehicle.location["lat"]
-            if self.vehicle and self.vehicle.location
-            else None
-        )
+        return self._position[0] if self._position else None
 
     @property
     def longitude(self) -> float | None:
         """Return the longitude of the vehicle."""
-        return (
-            self.vehicle.location["lon"]
-            if self.vehicle and self.vehicle.location
-            else None
-        )
+        return self._position[1] if self._position else None
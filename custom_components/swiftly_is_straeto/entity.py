@@ -2,10 +2,18 @@
 
 from __future__ import annotations
 
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
 from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.event import async_call_later
 
-from .const import DOMAIN
+from .const import CONF_VEHICLE_TTL, DEFAULT_VEHICLE_TTL, DOMAIN
+from .models import Vehicle
 
 
 class SwiftlyIsStraetoBaseEntity(Entity):
@@ -31,3 +39,82 @@ class SwiftlyIsStraetoBaseEntity(Entity):
             manufacturer="Strætó Bs.",
             model="Rauntíma gögn frá Swiftly",
         )
+
+
+class KnownVehicles:
+    """Vehicles a platform has added entities for.
+
+    Entities of vehicles the coordinator reports as expired are removed from
+    the entity registry, which also removes them from the platform, and the
+    vehicles are forgotten so their entities are added again if they return.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        entry: ConfigEntry,
+        domain: str,
+        keys: Iterable[str],
+    ) -> None:
+        """Initialize KnownVehicles.
+
+        :param domain: Domain of the platform the entities belong to.
+        :param keys: Keys passed to Vehicle.get_unique_id for each entity.
+        """
+        self.hass = hass
+        self.entry = entry
+        self.domain = domain
+        self.suffixes = tuple(f"_{key}" for key in keys)
+        # Block ID to the unique ID prefixes of the entities added for it
+        self._prefixes: dict[str, set[str]] = {}
+
+    def add(self, vehicle: Vehicle) -> bool:
+        """Remember a vehicle and return True if it had no entities yet."""
+        prefixes = self._prefixes.setdefault(vehicle.block_id, set())
+        if vehicle.unique_id_prefix in prefixes:
+            return False
+        prefixes.add(vehicle.unique_id_prefix)
+        return True
+
+    @callback
+    def async_evict(self, block_ids: Iterable[str]) -> None:
+        """Remove the entities of vehicles that are gone."""
+        registry = er.async_get(self.hass)
+        for block_id in block_ids:
+            for prefix in self._prefixes.pop(block_id, ()):
+                for suffix in self.suffixes:
+                    if entity_id := registry.async_get_entity_id(
+                        self.domain, DOMAIN, f"{prefix}{suffix}"
+                    ):
+                        registry.async_remove(entity_id)
+
+    @callback
+    def async_evict_orphans(self) -> CALLBACK_TYPE:
+        """Remove entities of vehicles not seen since before a restart.
+
+        The entities are removed once the vehicle TTL has passed, unless the
+        vehicle has appeared again by then.
+        """
+        registry = er.async_get(self.hass)
+        orphans = {
+            entity.unique_id: entity.entity_id
+            for entity in er.async_entries_for_config_entry(
+                registry, self.entry.entry_id
+            )
+            if entity.domain == self.domain and entity.unique_id.endswith(self.suffixes)
+        }
+
+        @callback
+        def _evict(_now: datetime) -> None:
+            known = {
+                f"{prefix}{suffix}"
+                for prefixes in self._prefixes.values()
+                for prefix in prefixes
+                for suffix in self.suffixes
+            }
+            for unique_id, entity_id in orphans.items():
+                if unique_id not in known and registry.async_get(entity_id):
+                    registry.async_remove(entity_id)
+
+        ttl = self.entry.options.get(CONF_VEHICLE_TTL, DEFAULT_VEHICLE_TTL)
+        return async_call_later(self.hass, timedelta(minutes=ttl), _evict)
@@ -0,0 +1,193 @@
+"""Columnar snapshot of the vehicles on monitored routes."""
+
+from array import array
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+import math
+
+from .models import Vehicle
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Mean radius of the earth in meters
+EARTH_RADIUS = 6_371_000.0
+
+
+@dataclass(frozen=True, slots=True)
+class AdherenceStats:
+    """Schedule adherence of the vehicles on a route, in seconds."""
+
+    count: int
+    mean: float
+    max: float
+
+
+@dataclass(frozen=True, slots=True)
+class BoundingBox:
+    """Smallest box containing the located vehicles."""
+
+    min_latitude: float
+    min_longitude: float
+    max_latitude: float
+    max_longitude: float
+
+
+class FleetSnapshot:
+    """Vehicle values stored as columns, one row per block ID.
+
+    Fleet wide calculations run over whole columns at once, with NumPy when it
+    is installed and plain Python loops over arrays otherwise. Missing
+    locations are stored as NaN and left out of every calculation.
+    """
+
+    __slots__ = (
+        "block_ids",
+        "heading",
+        "index",
+        "latitude",
+        "longitude",
+        "route_codes",
+        "route_ids",
+        "schedule_adherence",
+        "speed",
+    )
+
+    def __init__(self, vehicles: Sequence[Vehicle] = ()) -> None:
+        """Initialize the snapshot from vehicle models.
+
+        When several vehicles share a block ID, the first one is used.
+        """
+        unique: dict[str, Vehicle] = {}
+        for vehicle in vehicles:
+            unique.setdefault(vehicle.block_id, vehicle)
+        rows = list(unique.values())
+        self.block_ids = tuple(vehicle.block_id for vehicle in rows)
+        self.index = {block_id: row for row, block_id in enumerate(self.block_ids)}
+        # Distinct route IDs, and the position of each row's route among them
+        self.route_ids = tuple({vehicle.route_id: None for vehicle in rows})
+        codes = {route_id: code for code, route_id in enumerate(self.route_ids)}
+        self.route_codes = _ints(codes[vehicle.route_id] for vehicle in rows)
+        self.latitude = _floats(vehicle.latitude for vehicle in rows)
+        self.longitude = _floats(vehicle.longitude for vehicle in rows)
+        self.heading = _floats(vehicle.heading for vehicle in rows)
+        self.speed = _floats(vehicle.speed for vehicle in rows)
+        self.schedule_adherence = _floats(
+            vehicle.schedule_adherence for vehicle in rows
+        )
+
+    def __len__(self) -> int:
+        """Return the number of vehicles."""
+        return len(self.block_ids)
+
+    def route_adherence(self) -> dict[str, AdherenceStats]:
+        """Return the mean and max schedule adherence of each route."""
+        values = self.schedule_adherence
+        if np is not None:
+            known = ~np.isnan(values)
+            codes = self.route_codes[known]
+            size = len(self.route_ids)
+            counts = np.bincount(codes, minlength=size)
+            sums = np.bincount(codes, weights=values[known], minlength=size)
+            maxima = np.full(size, -np.inf)
+            np.maximum.at(maxima, codes, values[known])
+            return {
+                route_id: AdherenceStats(
+                    int(counts[code]),
+                    float(sums[code] / counts[code]),
+                    float(maxima[code]),
+                )
+                for code, route_id in enumerate(self.route_ids)
+                if counts[code]
+            }
+        totals: dict[int, list[float]] = {}
+        for code, value in zip(self.route_codes, values, strict=True):
+            if math.isnan(value):
+                continue
+            if (total := totals.get(code)) is None:
+                totals[code] = [1, value, value]
+            else:
+                total[0] += 1
+                total[1] += value
+                total[2] = max(total[2], value)
+        return {
+            self.route_ids[code]: AdherenceStats(int(count), total / count, maximum)
+            for code, (count, total, maximum) in sorted(totals.items())
+        }
+
+    def bounding_box(self, route_id: str | None = None) -> BoundingBox | None:
+        """Return the box containing the located vehicles, on one route or all."""
+        latitude, longitude = self.latitude, self.longitude
+        code: int | None = None
+        if route_id is not None:
+            if route_id not in self.route_ids:
+                return None
+            code = self.route_ids.index(route_id)
+        if np is not None:
+            rows = ~np.isnan(latitude) & ~np.isnan(longitude)
+            if code is not None:
+                rows &= self.route_codes == code
+            if not rows.any():
+                return None
+            return BoundingBox(
+                float(latitude[rows].min()),
+                float(longitude[rows].min()),
+                float(latitude[rows].max()),
+                float(longitude[rows].max()),
+            )
+        points = [
+            (lat, lon)
+            for lat, lon, route_code in zip(
+                latitude, longitude, self.route_codes, strict=True
+            )
+            if not (math.isnan(lat) or math.isnan(lon))
+            and (code is None or route_code == code)
+        ]
+        if not points:
+            return None
+        latitudes, longitudes = zip(*points, strict=True)
+        return BoundingBox(
+            min(latitudes), min(longitudes), max(latitudes), max(longitudes)
+        )
+
+    def distances_to(self, latitude: float, longitude: float) -> Sequence[float]:
+        """Return the great circle distance in meters from each vehicle to a point.
+
+        The distances are in row order, NaN for vehicles without a location.
+        """
+        lat = math.radians(latitude)
+        lon = math.radians(longitude)
+        if np is not None:
+            lats = np.radians(self.latitude)
+            half_dlat = (lats - lat) / 2
+            half_dlon = (np.radians(self.longitude) - lon) / 2
+            a = np.sin(half_dlat) ** 2 + np.cos(lats) * math.cos(lat) * (
+                np.sin(half_dlon) ** 2
+            )
+            return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        cos_lat = math.cos(lat)
+        distances = array("d")
+        for vehicle_lat, vehicle_lon in zip(self.latitude, self.longitude, strict=True):
+            lat2 = math.radians(vehicle_lat)
+            a = (
+                math.sin((lat2 - lat) / 2) ** 2
+                + math.cos(lat2)
+                * cos_lat
+                * math.sin((math.radians(vehicle_lon) - lon) / 2) ** 2
+            )
+            distances.append(2 * EARTH_RADIUS * math.asin(math.sqrt(min(a, 1.0))))
+        return distances
+
+
+def _floats(values: Iterable[float | None]) -> Sequence[float]:
+    """Return a float column, with NaN for missing values."""
+    column = array("d", (math.nan if value is None else value for value in values))
+    return np.frombuffer(column, dtype=np.float64) if np is not None else column
+
+
+def _ints(values: Iterable[int]) -> Sequence[int]:
+    """Return an integer column."""
+    column = array("q", values)
+    return np.frombuffer(column, dtype=np.int64) if np is not None else column
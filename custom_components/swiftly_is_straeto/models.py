@@ -1,15 +1,17 @@
 """Models for Swiftly IS Straeto integration."""
 
+from collections.abc import Callable, Iterator, Mapping
+from copy import copy
+from dataclasses import dataclass
 from datetime import UTC, datetime
-from typing import TypedDict
-
-from homeassistant.helpers.typing import StateType
+from operator import attrgetter
+from typing import Self, TypedDict
 
 from .api import (
     JSONLocation,
-    JSONPrediction,
     JSONPredictionData,
     JSONRoute,
+    JSONRouteData,
     JSONStop,
     JSONVehicle,
 )
@@ -24,162 +26,322 @@ class VehicleExtraStateAttributes(TypedDict):
     interval_seconds: int
 
 
+class ArrivalAttributes(TypedDict):
+    """State attributes for one of the next arrivals at a stop."""
+
+    time: datetime
+    headsign: str
+    vehicle_id: str
+
+
 class PredictionExtraStateAttributes(TypedDict):
     """Extra state attributes for a Swiftly IS Straeto prediction."""
 
+    headsign: str
     vehicle_id: str
     block_id: int
     trip_id: str
+    arrivals: list[ArrivalAttributes]
+
+
+VEHICLE_FIELDS = frozenset(
+    {
+        "id",
+        "routeId",
+        "routeName",
+        "headsign",
+        "loc",
+        "schAdhSecs",
+        "schAdhStr",
+        "scheduledHeadwaySecs",
+        "nextStopName",
+        "blockId",
+    }
+)
 
 
+@dataclass(frozen=True, slots=True)
 class Vehicle:
-    """Class for a vehicle on a specific route direction within a specific route."""
+    """Class for a vehicle on a specific route direction within a specific route.
 
-    def __init__(
-        self,
-        vehicle_data: JSONVehicle,
-        route_subentry_mapping: dict[str, str],
-    ) -> None:
-        """Initialize Vehicle."""
-        self._vehicle_data = vehicle_data
-        self._subentry_id = route_subentry_mapping.get(vehicle_data["routeId"])
+    Only the VEHICLE_FIELDS used by entities are copied out of the API payload,
+    so the model does not keep the verbose vehicle dict alive. Vehicles are
+    immutable and compare equal when all their values are equal.
+    """
 
-    @property
-    def route_id(self) -> str:
-        """Return the route ID for this vehicle."""
-        return self._vehicle_data["routeId"]
+    vehicle_id: str
+    route_id: str
+    route_name: str
+    headsign: str
+    schedule_adherence: int
+    schedule_adherence_string: str
+    scheduled_headway: int
+    next_stop_name: str
+    block_id: str
+    subentry_id: str | None
+    # Prefix of the unique IDs of the entities of this vehicle
+    unique_id_prefix: str
+    latitude: float | None = None
+    longitude: float | None = None
+    heading: float | None = None
+    speed: float | None = None
+    location_time: int | None = None
+
+    @classmethod
+    def from_json(cls, vehicle_data: JSONVehicle, subentry_id: str | None) -> Self:
+        """Build a vehicle from its decoded API payload."""
+        block_id = vehicle_data["blockId"]
+        location: JSONLocation | None = vehicle_data.get("loc")
+        return cls(
+            vehicle_data["id"],
+            vehicle_data["routeId"],
+            vehicle_data["routeName"],
+            vehicle_data["headsign"],
+            vehicle_data["schAdhSecs"],
+            vehicle_data["schAdhStr"],
+            vehicle_data["scheduledHeadwaySecs"],
+            vehicle_data["nextStopName"],
+            block_id,
+            subentry_id,
+            f"{subentry_id}_{block_id.replace('-', '')}",
+            *(
+                (
+                    location["lat"],
+                    location["lon"],
+                    location.get("heading"),
+                    location.get("speed"),
+                    location.get("time"),
+                )
+                if location
+                else ()
+            ),
+        )
 
     @property
-    def route_name(self) -> str:
-        """Return the route Name for this vehicle."""
-        return self._vehicle_data["routeName"]
+    def extra_state_attributes(self) -> VehicleExtraStateAttributes:
+        """Return the extra state attributes for this vehicle."""
+        return {
+            "vehicle_id": self.vehicle_id,
+            "schedule_adherence_string": self.schedule_adherence_string,
+            "headsign": self.headsign,
+            "interval_seconds": self.scheduled_headway,
+        }
 
-    @property
-    def next_stop_name(self) -> str:
-        """Return the next stop name for this vehicle."""
-        return self._vehicle_data["nextStopName"]
+    def get_unique_id(self, key: str) -> str:
+        """Return a unique ID for a vehicle entity."""
+        return f"{self.unique_id_prefix}_{key}"
 
-    @property
-    def schedule_adherence(self) -> int:
-        """Return the schedule adherence in seconds for this vehicle."""
-        return self._vehicle_data["schAdhSecs"]
 
-    @property
-    def headsign(self) -> str:
-        """Return the headsign for this vehicle."""
-        return self._vehicle_data["headsign"]
+# Key of the predicted arrival time entity, part of its unique ID
+PREDICTED_ARRIVAL_KEY = "predicted_arrival_time"
 
-    @property
-    def block_id(self) -> str:
-        """Return the block ID for this vehicle."""
-        return self._vehicle_data["blockId"]
 
-    @property
-    def extra_state_attributes(self) -> VehicleExtraStateAttributes:
-        """Return the extra state attributes for this vehicle."""
-        return {
-            "vehicle_id": self._vehicle_data["id"],
-            "schedule_adherence_string": self._vehicle_data["schAdhStr"],
-            "headsign": self._vehicle_data["headsign"],
-            "interval_seconds": self._vehicle_data["scheduledHeadwaySecs"],
-        }
+@dataclass(frozen=True, slots=True)
+class Arrival:
+    """A predicted arrival of a vehicle at a stop."""
 
-    @property
-    def location(self) -> JSONLocation | None:
-        """Return the current location of the vehicle."""
-        return self._vehicle_data.get("loc", None)
+    time: datetime
+    headsign: str
+    # Seconds until arrival when the prediction was made
+    seconds: int | None
+    vehicle_id: str
+    block_id: str
+    trip_id: str
 
     @property
-    def subentry_id(self) -> str:
-        """Return the subentry ID for this vehicle."""
-        return self._subentry_id
-
-    def get_unique_id(self, key: str) -> str:
-        """Return a unique ID for a vehicle entity."""
-        return f"{self._subentry_id}_{self._vehicle_data['blockId'].replace('-', '')}_{key}"
+    def state_attributes(self) -> ArrivalAttributes:
+        """Return the arrival as a compact state attribute."""
+        return {
+            "time": self.time,
+            "headsign": self.headsign,
+            "vehicle_id": self.vehicle_id,
+        }
 
 
+@dataclass(frozen=True, slots=True)
 class Prediction:
-    """Class for a prediction for a specific stop on a specific route direction within a specific route."""
+    """Class for a prediction for a specific stop on a specific route direction within a specific route.
 
-    def __init__(
-        self,
-        prediction_data: JSONPredictionData,
-        route_subentry_mapping: dict[str, str],
-    ) -> None:
-        """Initialize Prediction."""
-        self._prediction_data = prediction_data
-        self._subentry_id = route_subentry_mapping.get(prediction_data["routeId"])
+    The predictions of every destination are merged into one list of arrivals,
+    earliest first, with the arrival times converted to datetimes once when
+    the model is built.
+    """
 
-    @property
-    def route_id(self) -> str:
-        """Return the route ID for this prediction."""
-        return self._prediction_data["routeId"]
+    route_id: str
+    route_name: str
+    stop_id: str
+    stop_name: str
+    subentry_id: str | None
+    unique_id: str
+    # Headsign of the first destination, kept stable for entity names; the
+    # next arrival's own headsign is only a state attribute
+    headsign: str = ""
+    # The next arrivals over all destinations, earliest first
+    arrivals: tuple[Arrival, ...] = ()
+
+    @classmethod
+    def from_json(
+        cls,
+        prediction_data: JSONPredictionData,
+        subentry_id: str | None,
+        number: int = 1,
+    ) -> Self:
+        """Build a prediction from its decoded API payload.
+
+        :param number: How many arrivals to keep.
+        """
+        route_id = prediction_data["routeId"]
+        stop_id = prediction_data["stopId"]
+        destinations = prediction_data.get("destinations") or []
+        arrivals = sorted(
+            (
+                Arrival(
+                    datetime.fromtimestamp(prediction["time"], tz=UTC),
+                    destination.get("headsign", ""),
+                    prediction.get("sec"),
+                    prediction["vehicleId"],
+                    prediction["blockId"],
+                    prediction["tripId"],
+                )
+                for destination in destinations
+                for prediction in destination.get("predictions", [])
+            ),
+            key=attrgetter("time"),
+        )[: max(1, number)]
+        headsign = destinations[0].get("headsign", "") if destinations else ""
+        return cls(
+            route_id,
+            prediction_data["routeName"],
+            stop_id,
+            prediction_data["stopName"],
+            subentry_id,
+            f"{subentry_id}_{route_id}_{stop_id}_{PREDICTED_ARRIVAL_KEY}",
+            headsign,
+            tuple(arrivals),
+        )
 
     @property
-    def route_name(self) -> str:
-        """Return the route Name for this prediction."""
-        return self._prediction_data["routeName"]
+    def key(self) -> tuple[str, str]:
+        """Return the stop and route this prediction is for."""
+        return self.stop_id, self.route_id
 
-    @property
-    def stop_name(self) -> str:
-        """Return the stop name for this prediction."""
-        return self._prediction_data["stopName"]
+    def get_unique_id(self, key: str) -> str:
+        """Return a unique ID for a prediction entity."""
+        return f"{self.subentry_id}_{self.route_id}_{self.stop_id}_{key}"
 
     @property
-    def stop_id(self) -> str:
-        """Return the stop ID for this prediction."""
-        return self._prediction_data["stopId"]
+    def next_arrival(self) -> Arrival | None:
+        """Return the earliest arrival."""
+        return self.arrivals[0] if self.arrivals else None
 
     @property
-    def headsign(self) -> str:
-        """Return the destination for this prediction."""
-        try:
-            return self._prediction_data["destinations"][0]["headsign"]
-        except (IndexError, KeyError):
-            return ""
+    def arrival_time(self) -> datetime | None:
+        """Return the earliest predicted arrival time."""
+        return self.arrivals[0].time if self.arrivals else None
 
     @property
-    def prediction(self) -> JSONPrediction:
-        """Return the first prediction."""
-        try:
-            return self._prediction_data["destinations"][0]["predictions"][0]
-        except (IndexError, KeyError):
+    def extra_state_attributes(self) -> PredictionExtraStateAttributes | None:
+        """Return the extra state attributes for this prediction."""
+        if not self.arrivals:
             return {}
+        arrival = self.arrivals[0]
+        return {
+            "headsign": arrival.headsign,
+            "vehicle_id": arrival.vehicle_id,
+            "block_id": arrival.block_id,
+            "trip_id": arrival.trip_id,
+            "arrivals": [arrival.state_attributes for arrival in self.arrivals],
+        }
 
-    @property
-    def arrival_time(self) -> datetime | StateType:
-        """Return the predicted arrival time in epoch milliseconds for this prediction."""
-        return (
-            datetime.fromtimestamp(self.prediction["time"], tz=UTC)
-            if self.prediction
-            else None
-        )
 
-    @property
-    def unique_id(self) -> str:
-        """Return a unique ID for a prediction entity."""
+class CoordinatorData[KeyT, ItemT]:
+    """Items of one coordinator refresh, indexed by the key entities use.
+
+    The index is built once per refresh so entities resolve their item in
+    constant time. When several items share a key, the first one is used.
+    While the API is unavailable the last refresh is served again, with
+    stale_since set to when it was fetched. Keys whose entities the refresh
+    removes are kept in expired, so a refresh that only expires keys does not
+    compare equal to the previous one and still notifies listeners.
+    """
+
+    __slots__ = ("expired", "index", "items", "stale_since")
+
+    def __init__(self, items: list[ItemT], key: Callable[[ItemT], KeyT]) -> None:
+        """Initialize CoordinatorData.
+
+        :param items: Items in the order the API returned them.
+        :param key: Function returning the key of an item.
+        """
+        self.items = items
+        self.stale_since: datetime | None = None
+        self.expired: frozenset[KeyT] = frozenset()
+        self.index: dict[KeyT, ItemT] = {}
+        for item in items:
+            self.index.setdefault(key(item), item)
+
+    def __iter__(self) -> Iterator[ItemT]:
+        """Iterate over the items."""
+        return iter(self.items)
+
+    def __len__(self) -> int:
+        """Return the number of items."""
+        return len(self.items)
+
+    def __eq__(self, other: object) -> bool:
+        """Return True if both refreshes returned the same, equally fresh items."""
+        if not isinstance(other, CoordinatorData):
+            return NotImplemented
         return (
-            f"{self._subentry_id}_{self.route_id}_{self.stop_id}_predicted_arrival_time"
+            self.items == other.items
+            and self.stale_since == other.stale_since
+            and self.expired == other.expired
         )
 
-    @property
-    def extra_state_attributes(self) -> PredictionExtraStateAttributes | None:
-        """Return the extra state attributes for this prediction."""
-        return (
-            {
-                "vehicle_id": self.prediction["vehicleId"],
-                "block_id": self.prediction["blockId"],
-                "trip_id": self.prediction["tripId"],
-            }
-            if self.prediction
-            else {}
+    def get(self, key: KeyT) -> ItemT | None:
+        """Return the item with the given key."""
+        return self.index.get(key)
+
+    def as_stale(self, since: datetime) -> Self:
+        """Return the same items, marked as served stale since a given time."""
+        data = copy(self)
+        data.stale_since = since
+        data.expired = frozenset()
+        return data
+
+
+@dataclass(frozen=True, slots=True)
+class SnapshotDelta[KeyT]:
+    """Keys added, removed and changed between two coordinator snapshots.
+
+    Expired keys have been missing for so long that their entities should be
+    removed altogether.
+    """
+
+    added: frozenset[KeyT] = frozenset()
+    removed: frozenset[KeyT] = frozenset()
+    changed: frozenset[KeyT] = frozenset()
+    expired: frozenset[KeyT] = frozenset()
+
+    @classmethod
+    def between(
+        cls, previous: Mapping[KeyT, object], current: Mapping[KeyT, object]
+    ) -> Self:
+        """Compare two snapshots indexed by key."""
+        return cls(
+            added=frozenset(current.keys() - previous.keys()),
+            removed=frozenset(previous.keys() - current.keys()),
+            changed=frozenset(
+                key
+                for key in current.keys() & previous.keys()
+                if current[key] != previous[key]
+            ),
         )
 
     @property
-    def subentry_id(self) -> str:
-        """Return the subentry ID for this prediction."""
-        return self._subentry_id
+    def keys(self) -> frozenset[KeyT]:
+        """Return every key whose entities need to update."""
+        return self.added | self.removed | self.changed
 
 
 class StraetoSubentryData(TypedDict, total=False):
@@ -190,13 +352,6 @@ class StraetoSubentryData(TypedDict, total=False):
     stops: list[str]
 
 
-class CoordinatorData(TypedDict):
-    """Data model for Swiftly IS Straeto coordinator data."""
-
-    vehicles: list[Vehicle]
-    predictions: list[Prediction]
-
-
 class ConfigFlowData(TypedDict):
     """Data model for Swiftly IS Straeto config flow data."""
 
@@ -211,6 +366,19 @@ class Route(JSONRoute):
     """Data model for a route with additional fields for Swiftly IS Straeto."""
 
 
+class RouteCacheEntry(TypedDict):
+    """Route data stored in the route cache."""
+
+    fetched_at: float
+    data: JSONRouteData
+
+
+class StoredRouteCache(TypedDict):
+    """Data model for the persisted route cache."""
+
+    entries: dict[str, RouteCacheEntry]
+
+
 class ErrorResponse(TypedDict):
     """Data model for a Swiftly error response."""
 
@@ -0,0 +1,182 @@
+"""Adaptive polling schedule for Swiftly IS Straeto."""
+
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, time, timedelta, tzinfo
+from types import MappingProxyType
+from typing import Self
+
+from homeassistant.config_entries import ConfigEntry
+
+from .api import SwiftlyAPIClient, batch_stops
+from .const import (
+    CONF_ROUTE,
+    CONF_STOPS,
+    DEFAULT_UPDATE_TIME,
+    FAST_UPDATE_TIME,
+    IDLE_UPDATE_TIME,
+    IMMINENT_ARRIVAL,
+    MAX_IDLE_UPDATE_TIME,
+    NEAR_ARRIVAL,
+    QUIET_UPDATE_TIME,
+    SERVICE_GAP,
+    SERVICE_START_LEAD,
+    SLOW_UPDATE_TIME,
+)
+from .models import Prediction, Vehicle
+
+
+@dataclass(frozen=True, slots=True)
+class PollingPlan:
+    """What a config entry polls, derived from its subentries.
+
+    The plan is built once and replaced only when subentries are added,
+    removed or reconfigured. A route monitored by several subentries belongs
+    to the first of them for vehicles, and each stop belongs to the subentry
+    that monitors it on that route.
+    """
+
+    # Monitored route IDs, in subentry order
+    routes: tuple[str, ...] = ()
+    # Stop ID to the route IDs it is monitored on
+    stops: Mapping[str, tuple[str, ...]] = field(
+        default_factory=lambda: MappingProxyType({})
+    )
+    # The stops split into groups that share one predictions request
+    stop_batches: tuple[Mapping[str, tuple[str, ...]], ...] = ()
+    # Route ID to the subentry that owns its vehicles
+    vehicle_subentries: Mapping[str, str] = field(
+        default_factory=lambda: MappingProxyType({})
+    )
+    # (stop ID, route ID) to the subentry that owns its prediction
+    prediction_subentries: Mapping[tuple[str, str], str] = field(
+        default_factory=lambda: MappingProxyType({})
+    )
+
+    @classmethod
+    def from_entry(cls, entry: ConfigEntry) -> Self:
+        """Build the polling plan for a config entry."""
+        vehicle_subentries: dict[str, str] = {}
+        prediction_subentries: dict[tuple[str, str], str] = {}
+        stops: dict[str, dict[str, None]] = {}
+        for subentry_id, subentry in entry.subentries.items():
+            if not (route := subentry.data.get(CONF_ROUTE)):
+                continue
+            vehicle_subentries.setdefault(route, subentry_id)
+            for stop in subentry.data.get(CONF_STOPS, []):
+                prediction_subentries.setdefault((stop, route), subentry_id)
+                stops.setdefault(stop, {})[route] = None
+        stop_routes = {stop: tuple(routes) for stop, routes in stops.items()}
+        return cls(
+            routes=tuple(vehicle_subentries),
+            stops=MappingProxyType(stop_routes),
+            stop_batches=tuple(
+                MappingProxyType(batch)
+                for batch in batch_stops(
+                    stop_routes, SwiftlyAPIClient.MAX_STOPS_PER_REQUEST
+                )
+            ),
+            vehicle_subentries=MappingProxyType(vehicle_subentries),
+            prediction_subentries=MappingProxyType(prediction_subentries),
+        )
+
+    def requests_per_refresh(self, multi_stop: bool = True) -> int:
+        """Return how many API requests one refresh of both pipelines makes."""
+        requests = 1 if self.routes else 0
+        return requests + (len(self.stop_batches) if multi_stop else len(self.stops))
+
+
+class PollingSchedule:
+    """Pick the next update intervals from the latest data.
+
+    Predictions are polled faster while a monitored arrival is a few minutes
+    away and slower while the next arrival is far off. When no vehicles run and
+    no arrivals are predicted, both pipelines back off until the time of day
+    service was first seen, in the agency time zone. One schedule is shared by
+    the vehicle and prediction coordinators of a config entry.
+    """
+
+    def __init__(self, time_zone: tzinfo = UTC) -> None:
+        """Initialize the polling schedule.
+
+        :param time_zone: Time zone of the agency, used for service hours.
+        """
+        self.time_zone = time_zone
+        self.first_trip: time | None = None
+        self.last_trip: datetime | None = None
+
+    def next_arrival(
+        self, predictions: list[Prediction], now: datetime
+    ) -> datetime | None:
+        """Return the earliest predicted arrival that has not passed."""
+        return min(
+            (
+                arrival
+                for prediction in predictions
+                if (arrival := prediction.arrival_time) is not None and arrival >= now
+            ),
+            default=None,
+        )
+
+    def observe(self, now: datetime) -> None:
+        """Record that a trip was running at the given time."""
+        self.last_trip = now
+        local = now.astimezone(self.time_zone).time()
+        if self.first_trip is None or local < self.first_trip:
+            self.first_trip = local
+
+    def in_service(self, now: datetime) -> bool:
+        """Return True if a trip was observed recently."""
+        return self.last_trip is not None and now - self.last_trip < SERVICE_GAP
+
+    def vehicle_interval(self, vehicles: list[Vehicle], now: datetime) -> timedelta:
+        """Return how long to wait before polling vehicles again."""
+        if vehicles:
+            self.observe(now)
+            return timedelta(seconds=DEFAULT_UPDATE_TIME)
+        if self.in_service(now):
+            # A gap between trips rather than the end of service.
+            return timedelta(seconds=QUIET_UPDATE_TIME)
+        return self._idle_interval(now)
+
+    def prediction_interval(
+        self, predictions: list[Prediction], now: datetime
+    ) -> timedelta:
+        """Return how long to wait before polling predictions again.
+
+        Only arrivals within NEAR_ARRIVAL count as service being observed, so
+        the first trip of the day predicted hours ahead does not move the
+        learned service hours earlier. Until then, the next poll is when the
+        arrival comes within NEAR_ARRIVAL, at most MAX_IDLE_UPDATE_TIME away.
+        """
+        if (next_arrival := self.next_arrival(predictions, now)) is None:
+            if self.in_service(now):
+                # Vehicles run but no monitored stop has an arrival yet.
+                return timedelta(seconds=SLOW_UPDATE_TIME)
+            return self._idle_interval(now)
+        until_arrival = next_arrival - now
+        if until_arrival > NEAR_ARRIVAL:
+            return min(
+                max(until_arrival - NEAR_ARRIVAL, timedelta(seconds=SLOW_UPDATE_TIME)),
+                timedelta(seconds=MAX_IDLE_UPDATE_TIME),
+            )
+        self.observe(now)
+        if until_arrival <= IMMINENT_ARRIVAL:
+            return timedelta(seconds=FAST_UPDATE_TIME)
+        return timedelta(seconds=DEFAULT_UPDATE_TIME)
+
+    def _idle_interval(self, now: datetime) -> timedelta:
+        """Return the interval to use outside service hours."""
+        if self.first_trip is None:
+            return timedelta(seconds=IDLE_UPDATE_TIME)
+        local_now = now.astimezone(self.time_zone)
+        service_start = (
+            datetime.combine(local_now.date(), self.first_trip, self.time_zone)
+            - SERVICE_START_LEAD
+        )
+        if service_start <= local_now:
+            service_start += timedelta(days=1)
+        return min(
+            max(service_start - local_now, timedelta(seconds=DEFAULT_UPDATE_TIME)),
+            timedelta(seconds=MAX_IDLE_UPDATE_TIME),
+        )
@@ -0,0 +1,135 @@
+"""Route metadata cache for Swiftly IS Straeto."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from datetime import timedelta
+import logging
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+from homeassistant.util.hass_dict import HassKey
+
+from .api import JSONRoute, JSONRouteData, JSONStop, SwiftlyAPIClient
+from .const import (
+    CONF_ROUTES,
+    CONF_STOPS,
+    DOMAIN,
+    JSON_DIRECTIONS,
+    JSON_ID,
+    ROUTE_CACHE_TTL,
+)
+from .models import RouteCacheEntry, StoredRouteCache
+
+_LOGGER = logging.getLogger(__name__)
+
+DATA_ROUTE_CACHE: HassKey[RouteCache] = HassKey(f"{DOMAIN}_route_cache")
+STORAGE_KEY = f"{DOMAIN}.routes"
+STORAGE_VERSION = 1
+SAVE_DELAY = 10
+
+ALL_ROUTES_KEY = "routes"
+
+
+@callback
+def async_get_route_cache(hass: HomeAssistant) -> RouteCache:
+    """Return the shared route cache."""
+    if (cache := hass.data.get(DATA_ROUTE_CACHE)) is None:
+        cache = hass.data[DATA_ROUTE_CACHE] = RouteCache(hass)
+    return cache
+
+
+class RouteCache:
+    """Cache route metadata in memory and on disk.
+
+    Entries older than the TTL are still served, while a fresh copy is fetched
+    in the background.
+    """
+
+    def __init__(self, hass: HomeAssistant, ttl: timedelta = ROUTE_CACHE_TTL) -> None:
+        """Initialize the route cache."""
+        self._hass = hass
+        self._ttl = ttl.total_seconds()
+        self._store: Store[StoredRouteCache] = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._entries: dict[str, RouteCacheEntry] | None = None
+        self._load_lock = asyncio.Lock()
+        self._refreshing: set[str] = set()
+
+    async def async_get_routes(self, client: SwiftlyAPIClient) -> JSONRouteData:
+        """Return all routes, without directions and shapes."""
+        return await self._async_get(ALL_ROUTES_KEY, client.get_routes)
+
+    async def async_get_route(
+        self, client: SwiftlyAPIClient, route_id: str
+    ) -> JSONRoute | None:
+        """Return verbose data, with directions, stops and shapes, for a route."""
+        data = await self._async_get(
+            f"route_{route_id}", lambda: client.get_routes([route_id], verbose=True)
+        )
+        routes = data.get(CONF_ROUTES, [])
+        return routes[0] if routes else None
+
+    async def async_get_route_stops(
+        self, client: SwiftlyAPIClient, route_id: str
+    ) -> dict[str, JSONStop]:
+        """Return the stops on a route, keyed by stop ID."""
+        route = await self.async_get_route(client, route_id)
+        if route is None:
+            return {}
+        return {
+            stop[JSON_ID]: stop
+            for direction in route.get(JSON_DIRECTIONS) or []
+            for stop in direction.get(CONF_STOPS, [])
+        }
+
+    async def _async_load(self) -> dict[str, RouteCacheEntry]:
+        """Load cached entries from disk once."""
+        async with self._load_lock:
+            if self._entries is None:
+                stored = await self._store.async_load()
+                self._entries = stored["entries"] if stored else {}
+        return self._entries
+
+    async def _async_get(
+        self, key: str, fetch: Callable[[], Awaitable[JSONRouteData]]
+    ) -> JSONRouteData:
+        """Return a cached entry, fetching it if missing and refreshing if stale."""
+        entries = await self._async_load()
+        if (entry := entries.get(key)) is None:
+            return await self._async_fetch(key, fetch)
+        if (
+            dt_util.utcnow().timestamp() - entry["fetched_at"] > self._ttl
+            and key not in self._refreshing
+        ):
+            self._refreshing.add(key)
+            self._hass.async_create_background_task(
+                self._async_refresh(key, fetch), f"{DOMAIN} refresh {key}"
+            )
+        return entry["data"]
+
+    async def _async_fetch(
+        self, key: str, fetch: Callable[[], Awaitable[JSONRouteData]]
+    ) -> JSONRouteData:
+        """Fetch an entry from the API and store it."""
+        data = await fetch()
+        entries = await self._async_load()
+        entries[key] = RouteCacheEntry(
+            fetched_at=dt_util.utcnow().timestamp(), data=data
+        )
+        self._store.async_delay_save(
+            lambda: StoredRouteCache(entries=entries), SAVE_DELAY
+        )
+        return data
+
+    async def _async_refresh(
+        self, key: str, fetch: Callable[[], Awaitable[JSONRouteData]]
+    ) -> None:
+        """Refresh a stale entry, keeping the old data if the refresh fails."""
+        try:
+            await self._async_fetch(key, fetch)
+        except Exception:  # noqa: BLE001
+            _LOGGER.debug("Failed to refresh cached route data for %s", key)
+        finally:
+            self._refreshing.discard(key)
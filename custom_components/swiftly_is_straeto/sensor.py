@@ -1,28 +1,33 @@
-"""Swiftly IS Straeto vehicle sensors."""
+"""Swiftly IS Straeto vehicle, route and prediction sensors."""
 
-from collections.abc import Callable
+from collections.abc import Callable, Iterable
 from dataclasses import dataclass
 from datetime import datetime
 
 from homeassistant.components.sensor import (
+    DOMAIN as SENSOR_DOMAIN,
     SensorDeviceClass,
     SensorEntity,
     SensorEntityDescription,
     SensorStateClass,
 )
 from homeassistant.const import UnitOfTime
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.helpers.entity_platform import AddConfigEntryEntitiesCallback
 from homeassistant.helpers.typing import StateType
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
-from .const import JSON_PREDICTIONS, JSON_VEHICLES
+from .const import ATTR_STALE_SINCE, CONF_ROUTE_NAME, COUNTDOWN_INTERVAL
 from .coordinator import (
     SwiftlyIsStraetoConfigEntry,
-    SwiftlyIsStraetoDataUpdateCoordinator,
+    SwiftlyIsStraetoPredictionCoordinator,
+    SwiftlyIsStraetoVehicleCoordinator,
 )
-from .entity import SwiftlyIsStraetoBaseEntity
+from .entity import KnownVehicles, SwiftlyIsStraetoBaseEntity
+from .fleet import AdherenceStats
 from .models import Prediction, Vehicle
+from .polling import PollingPlan
 
 
 @dataclass(frozen=True, kw_only=True)
@@ -54,62 +59,159 @@ VEHICLE_SENSORS: tuple[VehicleSensorEntityDescription, ...] = (
 )
 
 
+@dataclass(frozen=True, kw_only=True)
+class RouteSensorEntityDescription(SensorEntityDescription):
+    """Describes a sensor aggregating the vehicles on a route."""
+
+    value_fn: Callable[[AdherenceStats | None], StateType]
+
+
+ROUTE_SENSORS: tuple[RouteSensorEntityDescription, ...] = (
+    RouteSensorEntityDescription(
+        key="mean_schedule_adherence",
+        translation_key="mean_schedule_adherence",
+        name="Meðalfrávik",
+        icon="mdi:clock-time-three-outline",
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda stats: stats.mean if stats else None,
+        suggested_display_precision=0,
+    ),
+    RouteSensorEntityDescription(
+        key="max_schedule_adherence",
+        translation_key="max_schedule_adherence",
+        name="Mesta frávik",
+        icon="mdi:clock-alert-outline",
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda stats: stats.max if stats else None,
+        suggested_display_precision=0,
+    ),
+    RouteSensorEntityDescription(
+        key="vehicle_count",
+        translation_key="vehicle_count",
+        name="Vagnar á ferð",
+        icon="mdi:bus-multiple",
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda stats: stats.count if stats else 0,
+    ),
+)
+
+
 async def async_setup_entry(
     hass: HomeAssistant,
     entry: SwiftlyIsStraetoConfigEntry,
     async_add_entities: AddConfigEntryEntitiesCallback,
 ) -> None:
-    """Set up available vehicle and prediction sensors."""
-    coordinator = entry.runtime_data
-    vehicles = coordinator.data.get(JSON_VEHICLES, [])
-    predictions = coordinator.data.get(JSON_PREDICTIONS, [])
+    """Set up available vehicle, route and prediction sensors."""
+    vehicle_coordinator = entry.runtime_data.vehicles
+    prediction_coordinator = entry.runtime_data.predictions
 
-    subentry_map: dict[str, list[SensorEntity]] = {}
+    known_vehicles = KnownVehicles(
+        hass,
+        entry,
+        SENSOR_DOMAIN,
+        (description.key for description in VEHICLE_SENSORS),
+    )
+    # Subentry and route pairs with route sensors
+    known_routes: set[tuple[str, str]] = set()
+    # Unique IDs of the predictions with sensors
+    known_predictions: set[str] = set()
 
-    for vehicle in vehicles:
-        subentry_map.setdefault(vehicle.subentry_id, []).extend(
-            SwiftlyIsStraetoVehicleSensor(coordinator, description, vehicle)
-            for description in VEHICLE_SENSORS
-        )
+    def _add_route_sensors() -> None:
+        """Add route sensors for configured routes that do not have them yet.
 
-    for prediction in predictions:
-        subentry_map.setdefault(prediction.subentry_id, []).append(
-            SwiftlyIsStraetoPredictionSensor(coordinator, prediction)
-        )
+        Routes come from the subentries rather than the vehicles, so a route
+        without any vehicles running gets its sensors as soon as it is added.
+        """
+        for route_id, subentry_id in PollingPlan.from_entry(
+            entry
+        ).vehicle_subentries.items():
+            if (subentry_id, route_id) in known_routes:
+                continue
+            known_routes.add((subentry_id, route_id))
+            route_name = entry.subentries[subentry_id].data.get(
+                CONF_ROUTE_NAME, route_id
+            )
+            async_add_entities(
+                [
+                    SwiftlyIsStraetoRouteSensor(
+                        vehicle_coordinator,
+                        description,
+                        subentry_id,
+                        route_id,
+                        route_name,
+                    )
+                    for description in ROUTE_SENSORS
+                ],
+                config_subentry_id=subentry_id,
+            )
 
-    # Add all entities to Home Assistant, attaching them to the correct subentry
-    for subentry_id, entities in subentry_map.items():
-        async_add_entities(entities, config_subentry_id=subentry_id)
-
-    def _update_entities() -> None:
-        """Add new vehicle and prediction sensors when new data appears."""
-        vehicles = coordinator.data.get(JSON_VEHICLES, [])
-        predictions = coordinator.data.get(JSON_PREDICTIONS, [])
-        known_ids = {
-            e.unique_id for entity_list in subentry_map.values() for e in entity_list
-        }
+    def _add_vehicle_sensors(vehicles: Iterable[Vehicle]) -> None:
+        """Add sensors for vehicles that do not have them yet."""
+        new_entities: dict[str | None, list[SensorEntity]] = {}
         for vehicle in vehicles:
-            if vehicle.get_unique_id("schedule_adherence_seconds") not in known_ids:
-                sensors = [
-                    SwiftlyIsStraetoVehicleSensor(coordinator, description, vehicle)
-                    for description in VEHICLE_SENSORS
-                ]
-                subentry_map.setdefault(vehicle.subentry_id, []).extend(sensors)
-                async_add_entities(sensors, config_subentry_id=vehicle.subentry_id)
+            if not known_vehicles.add(vehicle):
+                continue
+            new_entities.setdefault(vehicle.subentry_id, []).extend(
+                SwiftlyIsStraetoVehicleSensor(vehicle_coordinator, description, vehicle)
+                for description in VEHICLE_SENSORS
+            )
+        # Attach the entities to the correct subentry
+        for subentry_id, entities in new_entities.items():
+            async_add_entities(entities, config_subentry_id=subentry_id)
+
+    def _add_prediction_sensors(predictions: Iterable[Prediction]) -> None:
+        """Add sensors for predictions that do not have them yet."""
+        new_entities: dict[str | None, list[SensorEntity]] = {}
         for prediction in predictions:
-            if prediction.unique_id not in known_ids:
-                sensor = SwiftlyIsStraetoPredictionSensor(coordinator, prediction)
-                subentry_map.setdefault(prediction.subentry_id, []).append(sensor)
-                async_add_entities(
-                    [sensor],
-                    config_subentry_id=prediction.subentry_id,
+            if prediction.unique_id in known_predictions:
+                continue
+            known_predictions.add(prediction.unique_id)
+            new_entities.setdefault(prediction.subentry_id, []).extend(
+                (
+                    SwiftlyIsStraetoPredictionSensor(
+                        prediction_coordinator, prediction
+                    ),
+                    SwiftlyIsStraetoCountdownSensor(prediction_coordinator, prediction),
                 )
+            )
+        for subentry_id, entities in new_entities.items():
+            async_add_entities(entities, config_subentry_id=subentry_id)
+
+    _add_route_sensors()
+    _add_vehicle_sensors(vehicle_coordinator.data)
+    _add_prediction_sensors(prediction_coordinator.data)
+
+    def _update_vehicle_entities() -> None:
+        """Add sensors for new vehicles and remove those of departed ones."""
+        known_vehicles.async_evict(vehicle_coordinator.delta.expired)
+        _add_vehicle_sensors(vehicle_coordinator.added_items())
 
-    entry.async_on_unload(coordinator.async_add_listener(_update_entities))
+    def _update_prediction_entities() -> None:
+        """Add new prediction sensors when new predictions appear."""
+        _add_prediction_sensors(prediction_coordinator.added_items())
+
+    async def _async_entry_updated(
+        hass: HomeAssistant, entry: SwiftlyIsStraetoConfigEntry
+    ) -> None:
+        """Add route sensors for subentries added since setup."""
+        _add_route_sensors()
+
+    entry.async_on_unload(known_vehicles.async_evict_orphans())
+    entry.async_on_unload(entry.add_update_listener(_async_entry_updated))
+    entry.async_on_unload(
+        vehicle_coordinator.async_add_listener(_update_vehicle_entities)
+    )
+    entry.async_on_unload(
+        prediction_coordinator.async_add_listener(_update_prediction_entities)
+    )
 
 
 class SwiftlyIsStraetoVehicleSensor(
-    CoordinatorEntity[SwiftlyIsStraetoDataUpdateCoordinator],
+    CoordinatorEntity[SwiftlyIsStraetoVehicleCoordinator],
     SwiftlyIsStraetoBaseEntity,
     SensorEntity,
 ):
@@ -119,29 +221,34 @@ class SwiftlyIsStraetoVehicleSensor(
 
     def __init__(
         self,
-        coordinator: SwiftlyIsStraetoDataUpdateCoordinator,
+        coordinator: SwiftlyIsStraetoVehicleCoordinator,
         description: VehicleSensorEntityDescription,
         vehicle: Vehicle,
     ) -> None:
         """Initialize the Swiftly IS Straeto vehicle sensor."""
-        super().__init__(coordinator)
+        # Only updated when this vehicle changes, see the coordinator delta.
+        super().__init__(coordinator, context=vehicle.block_id)
         SwiftlyIsStraetoBaseEntity.__init__(
             self,
             vehicle.route_id,
             vehicle.route_name,
         )
         self.block_id = vehicle.block_id
+        self._vehicle: Vehicle | None = vehicle
         self.entity_description = description
         self._attr_unique_id = vehicle.get_unique_id(description.key)
         self._attr_name = f"{vehicle.block_id} {description.name}"
 
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Resolve the vehicle once for every property read while writing state."""
+        self._vehicle = self.coordinator.data.get(self.block_id)
+        super()._handle_coordinator_update()
+
     @property
     def vehicle(self) -> Vehicle | None:
         """Return the vehicle data for this sensor."""
-        for v in self.coordinator.data.get(JSON_VEHICLES, []):
-            if v.block_id == self.block_id:
-                return v
-        return None
+        return self._vehicle
 
     @property
     def available(self) -> bool:
@@ -154,13 +261,60 @@ class SwiftlyIsStraetoVehicleSensor(
         return self.entity_description.value_fn(self.vehicle) if self.vehicle else None
 
     @property
-    def extra_state_attributes(self) -> dict[str, str | int]:
+    def extra_state_attributes(self) -> dict[str, str | int | datetime]:
         """Return the state attributes of the sensor."""
-        return self.vehicle.extra_state_attributes if self.vehicle else {}
+        attributes = self.vehicle.extra_state_attributes if self.vehicle else {}
+        if (stale_since := self.coordinator.data.stale_since) is not None:
+            return {**attributes, ATTR_STALE_SINCE: stale_since}
+        return attributes
+
+
+class SwiftlyIsStraetoRouteSensor(
+    CoordinatorEntity[SwiftlyIsStraetoVehicleCoordinator],
+    SwiftlyIsStraetoBaseEntity,
+    SensorEntity,
+):
+    """Sensor aggregating all vehicles on a route, from the fleet snapshot."""
+
+    entity_description: RouteSensorEntityDescription
+
+    def __init__(
+        self,
+        coordinator: SwiftlyIsStraetoVehicleCoordinator,
+        description: RouteSensorEntityDescription,
+        subentry_id: str,
+        route_id: str,
+        route_name: str,
+    ) -> None:
+        """Initialize the Swiftly IS Straeto route sensor."""
+        # Updated on every refresh that changes any vehicle.
+        super().__init__(coordinator)
+        SwiftlyIsStraetoBaseEntity.__init__(self, route_id, route_name)
+        self._stats = coordinator.route_adherence.get(route_id)
+        self.entity_description = description
+        self._attr_unique_id = f"{subentry_id}_{route_id}_{description.key}"
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Resolve the route statistics once for every property read."""
+        self._stats = self.coordinator.route_adherence.get(self.route_id)
+        super()._handle_coordinator_update()
+
+    @property
+    def native_value(self) -> StateType:
+        """Return the state of the sensor."""
+        return self.entity_description.value_fn(self._stats)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, datetime]:
+        """Return the state attributes of the sensor."""
+        if (stale_since := self.coordinator.data.stale_since) is not None:
+            return {ATTR_STALE_SINCE: stale_since}
+        return {}
 
 
 class SwiftlyIsStraetoPredictionSensor(
-    CoordinatorEntity[SwiftlyIsStraetoDataUpdateCoordinator],
+    CoordinatorEntity[SwiftlyIsStraetoPredictionCoordinator],
     SwiftlyIsStraetoBaseEntity,
     SensorEntity,
 ):
@@ -168,30 +322,35 @@ class SwiftlyIsStraetoPredictionSensor(
 
     def __init__(
         self,
-        coordinator: SwiftlyIsStraetoDataUpdateCoordinator,
+        coordinator: SwiftlyIsStraetoPredictionCoordinator,
         data: Prediction,
     ) -> None:
         """Initialize the Swiftly IS Straeto prediction sensor."""
-        super().__init__(coordinator)
+        # Only updated when this prediction changes, see the coordinator delta.
+        super().__init__(coordinator, context=data.key)
         SwiftlyIsStraetoBaseEntity.__init__(
             self,
             data.route_id,
             data.route_name,
         )
         self.stop_id = data.stop_id
+        self._prediction: Prediction | None = data
         self.route_id = data.route_id
         self._attr_name = f"{data.stop_name} -> {data.headsign}"
         self._attr_unique_id = data.unique_id
         self._attr_device_class = SensorDeviceClass.TIMESTAMP
         self._attr_translation_key = "predicted_arrival_time"
 
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Resolve the prediction once for every property read while writing state."""
+        self._prediction = self.coordinator.data.get((self.stop_id, self.route_id))
+        super()._handle_coordinator_update()
+
     @property
     def prediction(self) -> Prediction | None:
         """Return the prediction data for this sensor."""
-        for p in self.coordinator.data.get(JSON_PREDICTIONS, []):
-            if p.stop_id == self.stop_id and p.route_id == self.route_id:
-                return p
-        return None
+        return self._prediction
 
     @property
     def available(self) -> bool:
@@ -204,6 +363,75 @@ class SwiftlyIsStraetoPredictionSensor(
         return self.prediction.arrival_time if self.prediction else None
 
     @property
-    def extra_state_attributes(self) -> dict[str, str | int]:
+    def extra_state_attributes(self) -> dict[str, str | int | datetime]:
         """Return the state attributes of the sensor."""
-        return self.prediction.extra_state_attributes if self.prediction else {}
+        attributes = self.prediction.extra_state_attributes if self.prediction else {}
+        if (stale_since := self.coordinator.stale_since(self.stop_id)) is not None:
+            # The stop or the API is failing and this is the last good prediction.
+            return {**attributes, ATTR_STALE_SINCE: stale_since}
+        return attributes
+
+
+class SwiftlyIsStraetoCountdownSensor(
+    CoordinatorEntity[SwiftlyIsStraetoPredictionCoordinator],
+    SwiftlyIsStraetoBaseEntity,
+    SensorEntity,
+):
+    """Minutes until the next arrival at a stop, counted down between polls.
+
+    The countdown is extrapolated locally on a timer, see ArrivalCountdown, and
+    the state is only written when the whole minutes change.
+    """
+
+    _attr_native_unit_of_measurement = UnitOfTime.MINUTES
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_icon = "mdi:timer-outline"
+    _attr_translation_key = "minutes_until_arrival"
+
+    def __init__(
+        self,
+        coordinator: SwiftlyIsStraetoPredictionCoordinator,
+        data: Prediction,
+    ) -> None:
+        """Initialize the Swiftly IS Straeto countdown sensor."""
+        super().__init__(coordinator, context=data.key)
+        SwiftlyIsStraetoBaseEntity.__init__(
+            self,
+            data.route_id,
+            data.route_name,
+        )
+        self.key = data.key
+        self._attr_name = f"{data.stop_name} -> {data.headsign} Mínútur í komu"
+        self._attr_unique_id = data.get_unique_id("minutes_until_arrival")
+        self._attr_native_value = self._minutes()
+
+    async def async_added_to_hass(self) -> None:
+        """Start counting down when added to hass."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_track_time_interval(self.hass, self._tick, COUNTDOWN_INTERVAL)
+        )
+
+    def _minutes(self) -> int | None:
+        """Return the extrapolated minutes until the next arrival."""
+        if (countdown := self.coordinator.countdowns.get(self.key)) is None:
+            return None
+        return countdown.minutes()
+
+    @callback
+    def _tick(self, _now: datetime) -> None:
+        """Write the state if the countdown reached another minute."""
+        if (minutes := self._minutes()) != self._attr_native_value:
+            self._attr_native_value = minutes
+            self.async_write_ha_state()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Restart from the countdown of the latest poll."""
+        self._attr_native_value = self._minutes()
+        super()._handle_coordinator_update()
+
+    @property
+    def available(self) -> bool:
+        """Return if the sensor is available."""
+        return super().available and self.key in self.coordinator.countdowns
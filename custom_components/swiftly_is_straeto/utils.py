@@ -1,27 +1,44 @@
 """Utility functions for Swiftly IS Straeto integration."""
 
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.util.hass_dict import HassKey
 
-from .const import CONF_ROUTE, CONF_STOPS
-
-
-def get_subentry_data(
-    entry: ConfigEntry,
-) -> tuple[list[str], dict[str, list[str]]]:
-    """Get subentry data from a config entry."""
-    subentries = entry.subentries
-    routeSubentryMapping: dict[str, str] = {}
-    routes: list[str] = []
-    stops: dict[str, list[str]] = {}
-    if subentries:
-        for subentry_id, subentry in subentries.items():
-            route = subentry.data.get(CONF_ROUTE)
-            routeSubentryMapping[route] = subentry_id
-            if route and route not in routes:
-                routes.append(route)
-            for stop in subentry.data.get(CONF_STOPS, []):
-                if stop not in stops:
-                    stops[stop] = [route]
-                else:
-                    stops[stop].append(route)
-    return routes, stops, routeSubentryMapping
+from .api import SwiftlyAPIClient
+from .const import (
+    CONF_RATE_LIMIT,
+    DEFAULT_RATE_LIMIT,
+    DOMAIN,
+    RESPONSE_FRESHNESS,
+)
+
+DATA_API_CLIENTS: HassKey[dict[str, SwiftlyAPIClient]] = HassKey(
+    f"{DOMAIN}_api_clients"
+)
+
+
+@callback
+def async_get_api_client(hass: HomeAssistant, api_key: str) -> SwiftlyAPIClient:
+    """Return the API client shared by everything that uses an API key.
+
+    Config entries, config flows and reconfigure steps all draw from the same
+    rate limit budget this way, and identical requests made at the same time
+    are sent only once.
+    """
+    clients = hass.data.setdefault(DATA_API_CLIENTS, {})
+    if (client := clients.get(api_key)) is None:
+        client = clients[api_key] = SwiftlyAPIClient(
+            api_key, async_get_clientsession(hass), freshness=RESPONSE_FRESHNESS
+        )
+    return client
+
+
+@callback
+def async_configure_rate_limit(client: SwiftlyAPIClient, entry: ConfigEntry) -> None:
+    """Size the client rate limiter to the quota set in the entry options."""
+    client.rate_limiter.configure(
+        entry.options.get(CONF_RATE_LIMIT, DEFAULT_RATE_LIMIT),
+        client.RATE_LIMIT_PERIOD,
+        client.RATE_LIMIT_BURST,
+    )
@@ -0,0 +1,439 @@
+"""Benchmark the full coordinator update cycle and entity fan-out.
+
+Runs the integration coordinators against the local fake Swiftly server and
+measures, per refresh: the update itself (HTTP, decode and model
+construction), JSON decode time, the platform listeners and the entity
+updates, including the property reads Home Assistant makes when writing each
+entity state. Allocations and peak memory are measured with tracemalloc on a
+separate refresh, along with the blocks and memory still held afterwards by the
+Vehicle and Prediction models it built.
+
+Requires Home Assistant to be installed (for example in the devcontainer).
+
+    python scripts/benchmark_coordinator.py --vehicles 10 100 1000 --stops 1 20 200
+    python scripts/benchmark_coordinator.py --output results.json
+    python scripts/benchmark_coordinator.py --compare results.json --threshold 10
+
+Results saved with --output can be compared with --compare on a later commit;
+the script exits with status 1 when a scenario is slower, or uses more memory,
+than the threshold allows.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections.abc import Callable, Iterable
+import datetime as dt
+from functools import partial
+import json
+from pathlib import Path
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import MappingProxyType
+from typing import Any
+
+from aiohttp import ClientSession
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+try:
+    from homeassistant.components.device_tracker import TrackerEntity
+    from homeassistant.config_entries import ConfigEntry, ConfigSubentryData
+    from homeassistant.const import CONF_API_KEY, CONF_DEVICE
+    from homeassistant.core import HomeAssistant
+    from homeassistant.helpers import device_registry as dr, entity_registry as er
+except ImportError:
+    raise SystemExit("This benchmark needs Home Assistant installed") from None
+
+from custom_components.swiftly_is_straeto import (  # noqa: E402
+    device_tracker,
+    models,
+    sensor,
+)
+from custom_components.swiftly_is_straeto.api import (  # noqa: E402
+    SwiftlyAPIClient,
+    TokenBucket,
+)
+from custom_components.swiftly_is_straeto.const import (  # noqa: E402
+    CONF_ROUTE,
+    CONF_ROUTE_NAME,
+    CONF_STOPS,
+    DOMAIN,
+)
+from custom_components.swiftly_is_straeto.coordinator import (  # noqa: E402
+    SwiftlyIsStraetoData,
+    SwiftlyIsStraetoPredictionCoordinator,
+    SwiftlyIsStraetoVehicleCoordinator,
+)
+from custom_components.swiftly_is_straeto.polling import (  # noqa: E402
+    PollingPlan,
+    PollingSchedule,
+)
+from fake_swiftly import FakeWorld, Faults, create_app, start_fake_server  # noqa: E402
+
+ROUTES = 10
+POLL_SECONDS = 30
+
+
+class Counters:
+    """Time and call counters collected during a refresh."""
+
+    def __init__(self) -> None:
+        """Initialize counters."""
+        self.reset()
+
+    def reset(self) -> None:
+        """Reset all counters."""
+        self.decode = 0.0
+        self.listeners = 0.0
+        self.state_reads = 0.0
+        self.states_written = 0
+
+
+def _timed_decoder(counters: Counters, decoder: Callable[[bytes], Any]) -> Callable:
+    """Wrap a decoder so its time is counted."""
+
+    def decode(body: bytes) -> Any:
+        start = time.perf_counter()
+        try:
+            return decoder(body)
+        finally:
+            counters.decode += time.perf_counter() - start
+
+    return decode
+
+
+def _write_state(counters: Counters, entity: Any) -> None:
+    """Read the properties Home Assistant reads when writing an entity state."""
+    if entity.available:
+        if isinstance(entity, TrackerEntity):
+            _ = (entity.latitude, entity.longitude)
+        else:
+            _ = entity.native_value
+        _ = entity.extra_state_attributes
+    counters.states_written += 1
+
+
+def _update_entity(counters: Counters, entity: Any) -> None:
+    """Handle a coordinator update the way a CoordinatorEntity does."""
+    start = time.perf_counter()
+    entity._handle_coordinator_update()  # noqa: SLF001
+    counters.state_reads += time.perf_counter() - start
+
+
+def _timed_listener(counters: Counters, listener: Callable[[], None]) -> Callable:
+    """Wrap a platform listener so its time is counted."""
+
+    def update() -> None:
+        start = time.perf_counter()
+        try:
+            listener()
+        finally:
+            counters.listeners += time.perf_counter() - start
+
+    return update
+
+
+def _add_timed_listener(
+    counters: Counters,
+    add_listener: Callable[..., Callable[[], None]],
+    listener: Callable[[], None],
+    context: Any = None,
+) -> Callable[[], None]:
+    """Add a platform listener whose time is counted."""
+    return add_listener(_timed_listener(counters, listener), context)
+
+
+def _config_entry(world: FakeWorld, stop_count: int) -> ConfigEntry:
+    """Create a config entry with one subentry per route."""
+    stops_by_route: dict[str, list[str]] = {route_id: [] for route_id in world.routes}
+    for stop_id, (route_id,) in world.stop_ids(stop_count).items():
+        stops_by_route[route_id].append(stop_id)
+    return ConfigEntry(
+        version=1,
+        minor_version=1,
+        domain=DOMAIN,
+        title="Benchmark",
+        data={CONF_API_KEY: "benchmark"},
+        source="user",
+        options={},
+        unique_id="benchmark",
+        discovery_keys=MappingProxyType({}),
+        subentries_data=[
+            ConfigSubentryData(
+                data={
+                    CONF_ROUTE: route_id,
+                    CONF_ROUTE_NAME: world.routes[route_id].name,
+                    CONF_STOPS: stops,
+                },
+                subentry_type=CONF_DEVICE,
+                title=world.routes[route_id].name,
+                unique_id=None,
+            )
+            for route_id, stops in stops_by_route.items()
+        ],
+    )
+
+
+async def _run_scenario(
+    hass: HomeAssistant,
+    session: ClientSession,
+    vehicles: int,
+    stops: int,
+    changing: bool,
+    rounds: int,
+) -> dict[str, Any]:
+    """Run one scenario and return its measurements."""
+    clock = {"now": 1_700_000_000.0}
+    world = FakeWorld(
+        vehicle_count=vehicles,
+        route_count=ROUTES,
+        stops_per_route=max(1, -(-stops // ROUTES)),
+        clock=lambda: clock["now"],
+    )
+    runner, base_url = await start_fake_server(create_app(world=world, faults=Faults()))
+    counters = Counters()
+    try:
+        client = SwiftlyAPIClient("benchmark", session, TokenBucket(10**6, 1, 10**6))
+        client.BASE_URL = base_url
+        client.decoder = _timed_decoder(counters, client.decoder)
+        entry = _config_entry(world, stops)
+        schedule = PollingSchedule()
+        plan = PollingPlan.from_entry(entry)
+        runtime_data = SwiftlyIsStraetoData(
+            vehicles=SwiftlyIsStraetoVehicleCoordinator(
+                hass, entry, client, schedule, plan
+            ),
+            predictions=SwiftlyIsStraetoPredictionCoordinator(
+                hass, entry, client, schedule, plan
+            ),
+            polling_schedule=schedule,
+        )
+        coordinators = (runtime_data.vehicles, runtime_data.predictions)
+
+        async def refresh() -> None:
+            await asyncio.gather(
+                *(coordinator.async_refresh() for coordinator in coordinators)
+            )
+
+        await refresh()
+        entry.runtime_data = runtime_data
+
+        entities: list[Any] = []
+        add_listeners = {
+            coordinator: coordinator.async_add_listener for coordinator in coordinators
+        }
+
+        def add_entities(
+            new_entities: Iterable[Any], config_subentry_id: str | None = None
+        ) -> None:
+            # Entities listen the way CoordinatorEntity does, with their context.
+            for entity in new_entities:
+                entities.append(entity)
+                entity.async_write_ha_state = partial(_write_state, counters, entity)
+                add_listeners[entity.coordinator](
+                    partial(_update_entity, counters, entity),
+                    entity.coordinator_context,
+                )
+
+        # Time the platform listeners that discover new entities.
+        for coordinator, add_listener in add_listeners.items():
+            coordinator.async_add_listener = partial(
+                _add_timed_listener, counters, add_listener
+            )
+        await sensor.async_setup_entry(hass, entry, add_entities)
+        await device_tracker.async_setup_entry(hass, entry, add_entities)
+        for coordinator, add_listener in add_listeners.items():
+            coordinator.async_add_listener = add_listener
+
+        totals, update, decode, listeners, reads, written = [], [], [], [], [], []
+        for _ in range(rounds):
+            if changing:
+                clock["now"] += POLL_SECONDS
+            counters.reset()
+            start = time.perf_counter()
+            await refresh()
+            total = time.perf_counter() - start
+            fanout = counters.listeners + counters.state_reads
+            totals.append(total)
+            update.append(total - fanout)
+            decode.append(counters.decode)
+            listeners.append(counters.listeners)
+            reads.append(counters.state_reads)
+            written.append(counters.states_written)
+
+        if changing:
+            clock["now"] += POLL_SECONDS
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        await refresh()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+        allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+        only_models = (tracemalloc.Filter(True, models.__file__),)
+        model_stats = after.filter_traces(only_models).compare_to(
+            before.filter_traces(only_models), "filename"
+        )
+        model_blocks = sum(stat.count_diff for stat in model_stats)
+        model_allocated = sum(stat.size_diff for stat in model_stats)
+        for coordinator in coordinators:
+            await coordinator.async_shutdown()
+    finally:
+        await runner.cleanup()
+
+    def _stats(values: list[float]) -> dict[str, float]:
+        ordered = sorted(values)
+        return {
+            "median": round(statistics.median(ordered) * 1000, 3),
+            "p95": round(
+                ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3
+            ),
+        }
+
+    return {
+        "vehicles": vehicles,
+        "stops": stops,
+        "mode": "changing" if changing else "unchanged",
+        "entities": len(entities),
+        "refresh_ms": _stats(totals),
+        "update_ms": _stats(update),
+        "decode_ms": _stats(decode),
+        "listeners_ms": _stats(listeners),
+        "state_reads_ms": _stats(reads),
+        "states_written": statistics.median(written),
+        "retained_blocks": blocks,
+        "retained_kb": round(allocated / 1024, 1),
+        "model_blocks": model_blocks,
+        "model_kb": round(model_allocated / 1024, 1),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def _scenario_key(result: dict[str, Any]) -> tuple:
+    """Return the key identifying a scenario across runs."""
+    return result["vehicles"], result["stops"], result["mode"]
+
+
+def _compare(results: list[dict], baseline_path: Path, threshold: float) -> bool:
+    """Print a comparison with a baseline and return True if nothing regressed."""
+    baseline = {
+        _scenario_key(result): result
+        for result in json.loads(baseline_path.read_text())["results"]
+    }
+    ok = True
+    print(f"\nCompared with {baseline_path} (threshold {threshold:g}%)")
+    for result in results:
+        if (previous := baseline.get(_scenario_key(result))) is None:
+            continue
+        for metric, value, old in (
+            (
+                "refresh",
+                result["refresh_ms"]["median"],
+                previous["refresh_ms"]["median"],
+            ),
+            ("peak", result["peak_kb"], previous["peak_kb"]),
+            ("models", result["model_kb"], previous.get("model_kb", 0.0)),
+        ):
+            change = (value - old) / old * 100 if old else 0.0
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                ok = False
+            print(
+                f"{result['vehicles']:>6} {result['stops']:>6} {result['mode']:>9} "
+                f"{metric:>8} {old:>10.2f} -> {value:>10.2f} {change:>+7.1f}%{flag}"
+            )
+    return ok
+
+
+def _metadata() -> dict[str, Any]:
+    """Return information identifying the run."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            cwd=ROOT,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "created_at": dt.datetime.now(dt.UTC).isoformat(),
+    }
+
+
+async def _main(args: argparse.Namespace) -> int:
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        # The platforms look up their entities in the registry to evict them.
+        await dr.async_load(hass)
+        await er.async_load(hass)
+        results = []
+        async with ClientSession() as session:
+            print(
+                f"{'veh':>6} {'stops':>6} {'mode':>9} {'ents':>6} {'refresh':>9} "
+                f"{'update':>8} {'decode':>8} {'listen':>8} {'reads':>8} "
+                f"{'writes':>7} {'peak KB':>9} {'model KB':>9}"
+            )
+            for vehicles in args.vehicles:
+                for stops in args.stops:
+                    for changing in (True, False):
+                        result = await _run_scenario(
+                            hass, session, vehicles, stops, changing, args.rounds
+                        )
+                        results.append(result)
+                        print(
+                            f"{vehicles:>6} {stops:>6} {result['mode']:>9} "
+                            f"{result['entities']:>6} "
+                            f"{result['refresh_ms']['median']:>9.2f} "
+                            f"{result['update_ms']['median']:>8.2f} "
+                            f"{result['decode_ms']['median']:>8.2f} "
+                            f"{result['listeners_ms']['median']:>8.2f} "
+                            f"{result['state_reads_ms']['median']:>8.2f} "
+                            f"{result['states_written']:>7.0f} "
+                            f"{result['peak_kb']:>9.0f} "
+                            f"{result['model_kb']:>9.0f}"
+                        )
+    if args.output:
+        args.output.write_text(
+            json.dumps({"meta": _metadata(), "results": results}, indent=2)
+        )
+        print(f"\nSaved results to {args.output}")
+    if args.compare and not _compare(results, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+def main() -> None:
+    """Parse arguments and run the benchmark suite."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vehicles", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--stops", type=int, nargs="+", default=[1, 20, 200])
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--output", type=Path, help="Save results as JSON")
+    parser.add_argument("--compare", type=Path, help="Baseline results to compare")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="Allowed slowdown or memory growth in percent",
+    )
+    sys.exit(asyncio.run(_main(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
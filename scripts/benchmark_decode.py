@@ -0,0 +1,111 @@
+"""Micro-benchmark decoding of Swiftly responses.
+
+Compares the previous path (aiohttp style str decode with the standard
+library followed by re-wrapping the top-level dict) with decoding the raw
+bytes once using every installed decoder. Uses synthetic verbose vehicle
+payloads unless recorded response bodies are given.
+
+    python scripts/benchmark_decode.py
+    python scripts/benchmark_decode.py --fixture vehicles.json predictions.json
+"""
+
+from __future__ import annotations
+
+import argparse
+from collections.abc import Callable
+import json
+from pathlib import Path
+import sys
+import timeit
+import tracemalloc
+from typing import Any
+
+sys.path.insert(
+    0,
+    str(
+        Path(__file__).resolve().parents[1] / "custom_components" / "swiftly_is_straeto"
+    ),
+)
+
+from api import DECODER_NAME  # noqa: E402
+from fake_swiftly import vehicles_payload  # noqa: E402
+
+
+def _decoders() -> dict[str, Callable[[bytes], Any]]:
+    """Return the decoding paths to compare."""
+
+    def previous(body: bytes) -> Any:
+        data = json.loads(body.decode("utf-8"))
+        return dict(**data).get("data")
+
+    decoders: dict[str, Callable[[bytes], Any]] = {
+        "json (previous)": previous,
+        "json": lambda body: json.loads(body)["data"],
+    }
+    try:
+        import orjson
+    except ImportError:
+        pass
+    else:
+        decoders["orjson"] = lambda body: orjson.loads(body)["data"]
+    try:
+        import msgspec
+    except ImportError:
+        pass
+    else:
+        decoder = msgspec.json.Decoder()
+        decoders["msgspec"] = lambda body: decoder.decode(body)["data"]
+    return decoders
+
+
+def _allocations(decode: Callable[[bytes], Any], body: bytes) -> tuple[int, int]:
+    """Return the number of live blocks and peak bytes allocated by a decode."""
+    tracemalloc.start()
+    try:
+        result = decode(body)
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+    return blocks, peak
+
+
+def _fixtures(args: argparse.Namespace) -> dict[str, bytes]:
+    """Return the response bodies to decode."""
+    if args.fixture:
+        return {path.name: path.read_bytes() for path in args.fixture}
+    return {
+        f"{count} vehicles": json.dumps(
+            vehicles_payload(count, 5, now=1_700_000_000)
+        ).encode()
+        for count in args.vehicles
+    }
+
+
+def main() -> None:
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixture", type=Path, nargs="*", default=[])
+    parser.add_argument("--vehicles", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"Client default decoder: {DECODER_NAME}")
+    print(
+        f"{'fixture':>16} {'size KB':>8} {'decoder':>16} {'ms/decode':>10} "
+        f"{'blocks':>8} {'peak KB':>8}"
+    )
+    for name, body in _fixtures(args).items():
+        for decoder_name, decode in _decoders().items():
+            seconds = timeit.timeit(lambda: decode(body), number=args.number)
+            blocks, peak = _allocations(decode, body)
+            print(
+                f"{name:>16} {len(body) / 1024:>8.0f} {decoder_name:>16} "
+                f"{seconds / args.number * 1000:>10.2f} {blocks:>8} {peak / 1024:>8.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
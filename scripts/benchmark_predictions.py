@@ -0,0 +1,99 @@
+"""Benchmark stop prediction fetching against the local fake Swiftly server.
+
+Compares a sequential cycle (one request in flight) with bounded concurrent
+cycles as the number of monitored stops grows, and reports how many HTTP
+requests each cycle needed.
+
+    python scripts/benchmark_predictions.py --latency 0.15 --stops 1 5 10 20 40 80
+    python scripts/benchmark_predictions.py --no-multi-stop
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from pathlib import Path
+import statistics
+import sys
+import time
+
+from aiohttp import ClientSession
+
+sys.path.insert(
+    0,
+    str(
+        Path(__file__).resolve().parents[1] / "custom_components" / "swiftly_is_straeto"
+    ),
+)
+
+from api import SwiftlyAPIClient, TokenBucket  # noqa: E402
+from fake_swiftly import FakeWorld, Faults, create_app, start_fake_server  # noqa: E402
+
+
+async def _run_cycle(
+    client: SwiftlyAPIClient, stops: dict[str, list[str]], max_concurrent: int
+) -> float:
+    """Run one prediction cycle and return its wall time in seconds."""
+    start = time.perf_counter()
+    predictions = await client.get_predictions_for_stops(
+        stops, max_concurrent=max_concurrent
+    )
+    elapsed = time.perf_counter() - start
+    if list(predictions) != list(stops) or not all(predictions.values()):
+        raise AssertionError("Predictions missing or returned out of order")
+    return elapsed
+
+
+async def _main(args: argparse.Namespace) -> None:
+    world = FakeWorld(route_count=20, stops_per_route=max(1, max(args.stops) // 20 + 1))
+    app = create_app(
+        world=world,
+        faults=Faults(latency=args.latency, multi_stop=not args.no_multi_stop),
+    )
+    runner, base_url = await start_fake_server(app)
+    try:
+        async with ClientSession() as session:
+            # The fake server has no quota, so keep the limiter out of the way.
+            client = SwiftlyAPIClient(
+                "benchmark", session, TokenBucket(10**6, 1, 10**6)
+            )
+            client.BASE_URL = base_url
+            print(
+                f"{'stops':>6} {'limit':>6} {'median ms':>10} {'max ms':>10} "
+                f"{'requests':>9}"
+            )
+            for count in args.stops:
+                stops = world.stop_ids(count)
+                for limit in args.limits:
+                    app["stats"]["requests"] = 0
+                    timings = [
+                        await _run_cycle(client, stops, limit)
+                        for _ in range(args.rounds)
+                    ]
+                    print(
+                        f"{count:>6} {limit:>6} "
+                        f"{statistics.median(timings) * 1000:>10.1f} "
+                        f"{max(timings) * 1000:>10.1f} "
+                        f"{app['stats']['requests'] / args.rounds:>9.1f}"
+                    )
+    finally:
+        await runner.cleanup()
+
+
+def main() -> None:
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.15)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--stops", type=int, nargs="+", default=[1, 5, 10, 20, 40, 80])
+    parser.add_argument("--limits", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument(
+        "--no-multi-stop",
+        action="store_true",
+        help="Make the fake server reject multi-stop requests",
+    )
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,621 @@
+"""Local stand-in for the Swiftly API.
+
+Serves /info, /info/routes, /real-time/predictions and /real-time/vehicles for
+a synthetic fleet of configurable size, or replays traffic recorded with
+scripts/record_swiftly.py. Latency, 429 and 5xx responses can be injected to
+reproduce production load and outages offline.
+
+    python scripts/fake_swiftly.py --vehicles 400 --routes 20 --latency 0.2
+    python scripts/fake_swiftly.py --error-rate-429 0.1 --retry-after 5
+    python scripts/fake_swiftly.py --replay traffic.jsonl --speed 10
+
+Point the integration at it by setting SwiftlyAPIClient.BASE_URL to the
+printed URL.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import bisect
+from collections.abc import Callable
+from dataclasses import dataclass, field
+import json
+import logging
+import math
+from pathlib import Path
+import random
+import time
+from typing import Any
+
+from aiohttp import web
+
+AGENCY_KEY = "is-straeto"
+PREDICTIONS_PATH = f"/real-time/{AGENCY_KEY}/predictions"
+CENTER = (64.1355, -21.8954)
+TRIP_SECONDS = 3600
+SHAPE_POINTS = 40
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class FakeRoute:
+    """A synthetic route running out from the city centre and back."""
+
+    route_id: str
+    index: int
+    shape: list[tuple[float, float]]
+    stops: list[tuple[str, float]]  # stop ID and fraction along the trip
+
+    @property
+    def name(self) -> str:
+        """Return the route name."""
+        return f"Leið {self.route_id}"
+
+    def position(self, fraction: float) -> tuple[float, float, float]:
+        """Return latitude, longitude and heading at a fraction of the trip."""
+        scaled = (fraction % 1) * (len(self.shape) - 1)
+        index = min(int(scaled), len(self.shape) - 2)
+        (lat1, lon1), (lat2, lon2) = self.shape[index], self.shape[index + 1]
+        part = scaled - index
+        heading = math.degrees(
+            math.atan2((lon2 - lon1) * math.cos(math.radians(lat1)), lat2 - lat1)
+        )
+        return lat1 + (lat2 - lat1) * part, lon1 + (lon2 - lon1) * part, heading % 360
+
+    def next_stop(self, fraction: float) -> tuple[str, float]:
+        """Return the next stop after a fraction of the trip."""
+        fraction %= 1
+        fractions = [stop_fraction for _, stop_fraction in self.stops]
+        return self.stops[bisect.bisect_right(fractions, fraction) % len(self.stops)]
+
+
+@dataclass
+class FakeWorld:
+    """A deterministic synthetic fleet moving along synthetic routes."""
+
+    vehicle_count: int = 100
+    route_count: int = 10
+    stops_per_route: int = 20
+    seed: int = 1
+    clock: Callable[[], float] = time.time
+    routes: dict[str, FakeRoute] = field(init=False)
+
+    def __post_init__(self) -> None:
+        """Build routes, shapes and stops."""
+        rng = random.Random(self.seed)
+        self.routes = {}
+        for index in range(self.route_count):
+            route_id = str(index + 1)
+            angle = 2 * math.pi * index / self.route_count
+            length = 0.05 + rng.random() * 0.05
+            half = SHAPE_POINTS // 2
+            outbound = [
+                (
+                    CENTER[0] + math.sin(angle) * length * i / half,
+                    CENTER[1] + math.cos(angle) * length * 2 * i / half,
+                )
+                for i in range(half + 1)
+            ]
+            shape = outbound + outbound[-2::-1]
+            stops = [
+                (f"{index + 1:02d}{stop:03d}", stop / self.stops_per_route)
+                for stop in range(self.stops_per_route)
+            ]
+            self.routes[route_id] = FakeRoute(route_id, index, shape, stops)
+
+    def _vehicle_fraction(self, index: int, now: float) -> float:
+        """Return how far along its trip a vehicle is."""
+        phase = (index // self.route_count) / max(
+            1, math.ceil(self.vehicle_count / self.route_count)
+        )
+        return (phase + now / TRIP_SECONDS) % 1
+
+    def _route_vehicles(
+        self, route_ids: set[str] | None
+    ) -> list[tuple[int, FakeRoute]]:
+        """Return the vehicles running on the given routes."""
+        routes = list(self.routes.values())
+        vehicles = [
+            (index, routes[index % len(routes)]) for index in range(self.vehicle_count)
+        ]
+        if route_ids is None:
+            return vehicles
+        return [
+            (index, route) for index, route in vehicles if route.route_id in route_ids
+        ]
+
+    def stop_ids(self, count: int) -> dict[str, list[str]]:
+        """Return count stops, spread over the routes, mapped to their route."""
+        stops = [
+            (stop_id, route.route_id)
+            for position in range(self.stops_per_route)
+            for route in self.routes.values()
+            for stop_id, _ in route.stops[position : position + 1]
+        ]
+        return {stop_id: [route_id] for stop_id, route_id in stops[:count]}
+
+    def vehicle(self, index: int, route: FakeRoute, now: float, verbose: bool) -> dict:
+        """Build a vehicle record."""
+        fraction = self._vehicle_fraction(index, now)
+        lat, lon, heading = route.position(fraction)
+        adherence = float((index * 37) % 300 - 150 + int(now / 60) % 30)
+        block_id = f"{route.route_id}-{index:04d}"
+        vehicle: dict[str, Any] = {
+            "id": f"{route.route_id}{index:04d}",
+            "routeId": route.route_id,
+            "routeShortName": route.route_id,
+            "routeName": route.name,
+            "headsign": f"Endastöð {route.route_id}",
+            "vehicleType": "3",
+            "loc": {
+                "lat": round(lat, 6),
+                "lon": round(lon, 6),
+                "time": int(now) - index % 15,
+                "speed": 8.0 + index % 5,
+                "heading": round(heading, 1),
+            },
+            "schAdhSecs": adherence,
+            "schAdhStr": f"{abs(int(adherence))} sec {'late' if adherence > 0 else 'early'}",
+            "headwaySecs": 600.0,
+            "scheduledHeadwaySecs": 600.0,
+            "previousVehicleId": f"{route.route_id}{max(0, index - 1):04d}",
+            "previousVehicleSchAdhSecs": 30.0,
+            "previousVehicleSchAdhStr": "30 sec late",
+        }
+        if not verbose:
+            return vehicle
+        stop_id, _ = route.next_stop(fraction)
+        return vehicle | {
+            "oaOptimalDepartureTimeEpochMsecs": None,
+            "oaOptimalDepartureTimeStr": None,
+            "layoverDepTime": None,
+            "layoverDepTimeStr": None,
+            "serviceDate": time.strftime("%Y-%m-%d", time.gmtime(now)),
+            "blockAssignmentInfo": block_id,
+            "isPredictable": True,
+            "tripShortName": f"{route.route_id}-{index}",
+            "tripPattern": f"{route.route_id}_pattern",
+            "layover": False,
+            "isAtStop": False,
+            "isAtWaitStop": False,
+            "nextStopPathIndex": int(stop_id[-3:]),
+            "nextStopId": stop_id,
+            "nextStopName": f"Stopp {stop_id}",
+            "stopScheduleTimeEpochMsecs": int(now + 60) * 1000,
+            "stopScheduleTimeStr": time.strftime("%H:%M", time.gmtime(now + 60)),
+            "distanceAlongStopPath": 100.0,
+            "stopPathIndex": int(stop_id[-3:]),
+            "gtfsStopSequence": int(stop_id[-3:]) + 1,
+            "serviceId": "weekday",
+            "isAddedService": False,
+            "isOnDetour": False,
+            "inYard": False,
+            "directionId": "0" if self._vehicle_fraction(index, now) < 0.5 else "1",
+            "tripId": f"{route.route_id}-trip-{index}-{int(now // TRIP_SECONDS)}",
+            "blockId": block_id,
+        }
+
+    def vehicles(
+        self, route_ids: set[str] | None, verbose: bool, now: float | None = None
+    ) -> dict:
+        """Build a vehicles response."""
+        now = self.clock() if now is None else now
+        return _response(
+            "vehicles",
+            {
+                "agencyKey": AGENCY_KEY,
+                "vehicles": [
+                    self.vehicle(index, route, now, verbose)
+                    for index, route in self._route_vehicles(route_ids)
+                ],
+            },
+        )
+
+    def predictions(
+        self,
+        stop_ids: list[str],
+        route_ids: set[str] | None,
+        number: int,
+        now: float | None = None,
+    ) -> dict:
+        """Build a predictions response for one or more stops."""
+        now = self.clock() if now is None else now
+        data = []
+        for stop_id in stop_ids:
+            route = self.routes.get(stop_id[:2].lstrip("0"))
+            if route is None or (route_ids and route.route_id not in route_ids):
+                continue
+            if (stop_fraction := dict(route.stops).get(stop_id)) is None:
+                continue
+            arrivals = sorted(
+                (
+                    ((stop_fraction - self._vehicle_fraction(index, now)) % 1)
+                    * TRIP_SECONDS,
+                    index,
+                )
+                for index, _ in self._route_vehicles({route.route_id})
+            )[:number]
+            data.append(
+                {
+                    "routeShortName": route.route_id,
+                    "routeName": route.name,
+                    "routeId": route.route_id,
+                    "stopId": stop_id,
+                    "stopName": f"Stopp {stop_id}",
+                    "stopCode": int(stop_id),
+                    "destinations": [
+                        {
+                            "directionId": "0",
+                            "headsign": f"Endastöð {route.route_id}",
+                            "predictions": [
+                                {
+                                    "time": int(now + seconds),
+                                    "sec": int(seconds),
+                                    "min": int(seconds // 60),
+                                    "departure": False,
+                                    "blockId": f"{route.route_id}-{index:04d}",
+                                    "vehicleId": f"{route.route_id}{index:04d}",
+                                    "tripId": f"{route.route_id}-trip-{index}",
+                                }
+                                for seconds, index in arrivals
+                            ],
+                        }
+                    ],
+                }
+            )
+        return _response(
+            "predictions", {"agencyKey": AGENCY_KEY, "predictionsData": data}
+        )
+
+    def route_list(self, route_ids: set[str] | None, verbose: bool) -> dict:
+        """Build a routes response."""
+        routes = []
+        for route in self.routes.values():
+            if route_ids and route.route_id not in route_ids:
+                continue
+            item: dict[str, Any] = {
+                "id": route.route_id,
+                "name": route.name,
+                "shortName": route.route_id,
+                "longName": route.name,
+                "color": "ffd600",
+                "type": "3",
+            }
+            if verbose:
+                half = len(route.stops) // 2
+                item["directions"] = [
+                    {
+                        "id": str(direction),
+                        "title": f"Átt {direction}",
+                        "headsigns": [f"Endastöð {route.route_id}"],
+                        "stops": [
+                            {
+                                "id": stop_id,
+                                "name": f"Stopp {stop_id}",
+                                "lat": round(route.position(fraction)[0], 6),
+                                "lon": round(route.position(fraction)[1], 6),
+                                "code": int(stop_id),
+                            }
+                            for stop_id, fraction in stops
+                        ],
+                    }
+                    for direction, stops in enumerate(
+                        (route.stops[:half], route.stops[half:])
+                    )
+                ]
+                item["shapes"] = [
+                    {
+                        "tripPatternId": f"{route.route_id}_pattern",
+                        "shapeId": f"{route.route_id}_shape",
+                        "directionId": "0",
+                        "headsign": f"Endastöð {route.route_id}",
+                        "locs": [
+                            {"lat": round(lat, 6), "lon": round(lon, 6)}
+                            for lat, lon in route.shape
+                        ],
+                    }
+                ]
+                lats = [lat for lat, _ in route.shape]
+                lons = [lon for _, lon in route.shape]
+                item["extent"] = {
+                    "minLat": min(lats),
+                    "minLon": min(lons),
+                    "maxLat": max(lats),
+                    "maxLon": max(lons),
+                }
+            routes.append(item)
+        return _response("routes", {"agencyKey": AGENCY_KEY, "routes": routes})
+
+    def info(self) -> dict:
+        """Build an agency info response."""
+        return _response(
+            "info",
+            {
+                "agencyKey": AGENCY_KEY,
+                "name": "Strætó bs.",
+                "url": "https://www.straeto.is",
+                "timezone": "Atlantic/Reykjavik",
+                "extent": {
+                    "minLat": CENTER[0] - 0.1,
+                    "minLon": CENTER[1] - 0.2,
+                    "maxLat": CENTER[0] + 0.1,
+                    "maxLon": CENTER[1] + 0.2,
+                },
+            },
+        )
+
+
+def _response(route: str, data: dict) -> dict:
+    """Wrap data in a Swiftly response envelope."""
+    return {"success": True, "route": f"/{route}", "data": data}
+
+
+def vehicles_payload(count: int, route_count: int, now: float | None = None) -> dict:
+    """Build a verbose vehicles response with count vehicles spread over routes."""
+    world = FakeWorld(vehicle_count=count, route_count=route_count)
+    return world.vehicles(None, verbose=True, now=now)
+
+
+class Replay:
+    """Serve responses recorded by scripts/record_swiftly.py.
+
+    Each line of the recording is a JSON object with the seconds since the
+    recording started (t), the request path, the query parameters, the status
+    and the response body. Time runs speed times faster than real time, and a
+    request is answered with the latest recorded response for the same path
+    and parameters.
+
+    Predictions are recorded per stop but requested in batches, so they are
+    looked up stop by stop instead, filtered to the requested routes and cut
+    to the requested number of arrivals. Requests without a recording are
+    logged and answered with synthetic data.
+    """
+
+    def __init__(self, path: Path, speed: float) -> None:
+        """Load a recording."""
+        self.speed = speed
+        self.started = time.monotonic()
+        self.frames: dict[tuple[str, frozenset], list[tuple[float, int, Any]]] = {}
+        self.stop_frames: dict[str, list[tuple[float, int, Any]]] = {}
+        self.misses: dict[str, int] = {}
+        with path.open(encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                frame = json.loads(line)
+                recorded = (frame["t"], frame["status"], frame["body"])
+                if frame["path"] == PREDICTIONS_PATH:
+                    for stop_id in frame["params"].get("stop", "").split(","):
+                        self.stop_frames.setdefault(stop_id, []).append(recorded)
+                    continue
+                key = (frame["path"], frozenset(frame["params"].items()))
+                self.frames.setdefault(key, []).append(recorded)
+        for frames in (*self.frames.values(), *self.stop_frames.values()):
+            frames.sort(key=lambda frame: frame[0])
+
+    def lookup(self, path: str, params: dict[str, str]) -> tuple[int, Any] | None:
+        """Return the status and body to answer a request with."""
+        if path == PREDICTIONS_PATH:
+            return self._lookup_predictions(params)
+        frames = self.frames.get((path, frozenset(params.items())))
+        if not frames:
+            self._miss(f"{path} {sorted(params.items())}")
+            return None
+        return self._at(frames)
+
+    def _lookup_predictions(self, params: dict[str, str]) -> tuple[int, Any] | None:
+        """Return a predictions response assembled from per stop recordings."""
+        stop_ids = [stop for stop in params.get("stop", "").split(",") if stop]
+        if missing := [stop for stop in stop_ids if stop not in self.stop_frames]:
+            self._miss(f"predictions for stops {','.join(missing)}")
+            return None
+        route_ids = {route for route in params.get("route", "").split(",") if route}
+        number = int(params.get("number", "1"))
+        data = []
+        for stop_id in stop_ids:
+            status, body = self._at(self.stop_frames[stop_id])
+            if status != 200:
+                return status, body
+            for item in body["data"]["predictionsData"]:
+                if item["stopId"] != stop_id or (
+                    route_ids and item["routeId"] not in route_ids
+                ):
+                    continue
+                destinations = [
+                    destination | {"predictions": destination["predictions"][:number]}
+                    for destination in item.get("destinations", [])
+                ]
+                data.append(item | {"destinations": destinations})
+        return 200, _response(
+            "predictions", {"agencyKey": AGENCY_KEY, "predictionsData": data}
+        )
+
+    def _at(self, frames: list[tuple[float, int, Any]]) -> tuple[int, Any]:
+        """Return the status and body of the frame current at the replay time."""
+        elapsed = (time.monotonic() - self.started) * self.speed
+        if elapsed > frames[-1][0]:
+            # Loop the recording once it has been played through
+            elapsed %= frames[-1][0] or 1
+        index = bisect.bisect_right([t for t, _, _ in frames], elapsed) - 1
+        _, status, body = frames[max(index, 0)]
+        return status, body
+
+    def _miss(self, request: str) -> None:
+        """Log a request without a recording, once per distinct request."""
+        self.misses[request] = self.misses.get(request, 0) + 1
+        if self.misses[request] == 1:
+            _LOGGER.warning("No recording of %s, serving synthetic data", request)
+
+
+@dataclass
+class Faults:
+    """Faults injected into responses."""
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate_429: float = 0.0
+    error_rate_5xx: float = 0.0
+    retry_after: float | None = None
+    multi_stop: bool = True
+    seed: int | None = None
+    rng: random.Random = field(init=False)
+
+    def __post_init__(self) -> None:
+        """Seed the random generator."""
+        self.rng = random.Random(self.seed)
+
+
+def create_app(
+    latency: float = 0.0,
+    multi_stop: bool = True,
+    *,
+    world: FakeWorld | None = None,
+    faults: Faults | None = None,
+    replay: Replay | None = None,
+) -> web.Application:
+    """Create the fake Swiftly application.
+
+    :param latency: Seconds to wait before answering each request.
+    :param multi_stop: Accept comma separated stop IDs in a single request.
+    """
+    world = world or FakeWorld()
+    faults = faults or Faults(latency=latency, multi_stop=multi_stop)
+    stats: dict[str, Any] = {"requests": 0, "by_path": {}, "429": 0, "5xx": 0}
+
+    def _route_ids(request: web.Request) -> set[str] | None:
+        value = request.query.get("route")
+        return {r for r in value.split(",") if r} if value else None
+
+    def _verbose(request: web.Request) -> bool:
+        return request.query.get("verbose", "false").lower() == "true"
+
+    @web.middleware
+    async def middleware(request: web.Request, handler: Any) -> web.StreamResponse:
+        stats["requests"] += 1
+        stats["by_path"][request.path] = stats["by_path"].get(request.path, 0) + 1
+        if faults.latency or faults.jitter:
+            await asyncio.sleep(faults.latency + faults.rng.random() * faults.jitter)
+        roll = faults.rng.random()
+        if roll < faults.error_rate_429:
+            stats["429"] += 1
+            headers = (
+                {"Retry-After": f"{faults.retry_after:g}"}
+                if faults.retry_after is not None
+                else {}
+            )
+            return web.json_response(
+                {"errorCode": 429, "errorMessage": "Too many requests"},
+                status=429,
+                headers=headers,
+            )
+        if roll < faults.error_rate_429 + faults.error_rate_5xx:
+            stats["5xx"] += 1
+            return web.json_response(
+                {"errorCode": 503, "errorMessage": "Service unavailable"}, status=503
+            )
+        if replay and (recorded := replay.lookup(request.path, dict(request.query))):
+            status, body = recorded
+            return web.json_response(body, status=status)
+        return await handler(request)
+
+    async def info(request: web.Request) -> web.Response:
+        return web.json_response(world.info())
+
+    async def routes(request: web.Request) -> web.Response:
+        return web.json_response(
+            world.route_list(_route_ids(request), _verbose(request))
+        )
+
+    async def predictions(request: web.Request) -> web.Response:
+        stop_ids = [s for s in request.query.get("stop", "").split(",") if s]
+        if not stop_ids or (len(stop_ids) > 1 and not faults.multi_stop):
+            return web.json_response(
+                {"errorCode": 400, "errorMessage": "Invalid stop"}, status=400
+            )
+        number = int(request.query.get("number", "1"))
+        return web.json_response(
+            world.predictions(stop_ids, _route_ids(request), number)
+        )
+
+    async def vehicles(request: web.Request) -> web.Response:
+        return web.json_response(world.vehicles(_route_ids(request), _verbose(request)))
+
+    app = web.Application(middlewares=[middleware])
+    app["stats"] = stats
+    app["world"] = world
+    app["faults"] = faults
+    app.router.add_get(f"/info/{AGENCY_KEY}", info)
+    app.router.add_get(f"/info/{AGENCY_KEY}/routes", routes)
+    app.router.add_get(PREDICTIONS_PATH, predictions)
+    app.router.add_get(f"/real-time/{AGENCY_KEY}/vehicles", vehicles)
+    return app
+
+
+async def start_fake_server(
+    app: web.Application, host: str = "127.0.0.1", port: int = 0
+) -> tuple[web.AppRunner, str]:
+    """Start the application and return the runner and its base URL."""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = runner.addresses[0][1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+def main() -> None:
+    """Run the fake server until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--vehicles", type=int, default=100)
+    parser.add_argument("--routes", type=int, default=10)
+    parser.add_argument("--stops-per-route", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Response latency in seconds"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="Random extra latency in seconds"
+    )
+    parser.add_argument("--error-rate-429", type=float, default=0.0)
+    parser.add_argument("--error-rate-5xx", type=float, default=0.0)
+    parser.add_argument(
+        "--retry-after", type=float, help="Retry-After seconds sent with 429s"
+    )
+    parser.add_argument(
+        "--no-multi-stop",
+        action="store_true",
+        help="Reject requests for more than one stop",
+    )
+    parser.add_argument("--replay", type=Path, help="Recording to replay")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="Replay speed multiplier"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    app = create_app(
+        world=FakeWorld(
+            vehicle_count=args.vehicles,
+            route_count=args.routes,
+            stops_per_route=args.stops_per_route,
+            seed=args.seed,
+        ),
+        faults=Faults(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate_429=args.error_rate_429,
+            error_rate_5xx=args.error_rate_5xx,
+            retry_after=args.retry_after,
+            multi_stop=not args.no_multi_stop,
+            seed=args.seed,
+        ),
+        replay=Replay(args.replay, args.speed) if args.replay else None,
+    )
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
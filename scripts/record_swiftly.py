@@ -0,0 +1,103 @@
+"""Record Swiftly API traffic for replay with scripts/fake_swiftly.py.
+
+Polls the vehicles endpoint for the given routes and the predictions endpoint
+for the given stops, and writes every response as one JSON line. Predictions
+are recorded one stop at a time, for all routes and with --number arrivals, so
+the replay can answer any batch of stops, route filter and arrivals option the
+integration requests.
+
+    python scripts/record_swiftly.py --api-key KEY --route 1 6 --stop 90000 \
+        --interval 30 --duration 3600 --output traffic.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+from pathlib import Path
+import time
+
+from aiohttp import ClientSession
+
+BASE_URL = "https://api.goswift.ly"
+AGENCY_KEY = "is-straeto"
+
+
+async def _record(
+    session: ClientSession,
+    headers: dict[str, str],
+    path: str,
+    params: dict[str, str],
+    started: float,
+) -> dict:
+    """Send a request and return it as a recording frame."""
+    sent = time.monotonic() - started
+    async with session.get(f"{BASE_URL}{path}", headers=headers, params=params) as r:
+        body = await r.json(content_type=None)
+        return {
+            "t": round(sent, 3),
+            "path": path,
+            "params": params,
+            "status": r.status,
+            "body": body,
+        }
+
+
+async def _main(args: argparse.Namespace) -> None:
+    headers = {"Authorization": args.api_key, "Accept": "application/json"}
+    requests: list[tuple[str, dict[str, str]]] = []
+    if args.route:
+        requests.append(
+            (
+                f"/real-time/{AGENCY_KEY}/vehicles",
+                {"route": ",".join(args.route), "verbose": "true"},
+            )
+        )
+    requests.extend(
+        (
+            f"/real-time/{AGENCY_KEY}/predictions",
+            {"stop": stop, "number": str(args.number)},
+        )
+        for stop in args.stop
+    )
+    if not requests:
+        raise SystemExit("Nothing to record, give --route and/or --stop")
+
+    started = time.monotonic()
+    async with ClientSession() as session:
+        with args.output.open("a", encoding="utf-8") as output:
+            while time.monotonic() - started < args.duration:
+                frames = await asyncio.gather(
+                    *(
+                        _record(session, headers, path, params, started)
+                        for path, params in requests
+                    )
+                )
+                for frame in frames:
+                    output.write(json.dumps(frame, ensure_ascii=False) + "\n")
+                output.flush()
+                print(f"{time.monotonic() - started:7.0f}s recorded {len(frames)}")
+                await asyncio.sleep(args.interval)
+
+
+def main() -> None:
+    """Parse arguments and record traffic."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--api-key", required=True)
+    parser.add_argument("--route", nargs="*", default=[])
+    parser.add_argument("--stop", nargs="*", default=[])
+    parser.add_argument(
+        "--number",
+        type=int,
+        default=10,
+        help="Arrivals recorded per stop, at least the arrivals option replayed",
+    )
+    parser.add_argument("--interval", type=float, default=30)
+    parser.add_argument("--duration", type=float, default=3600)
+    parser.add_argument("--output", type=Path, default=Path("traffic.jsonl"))
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
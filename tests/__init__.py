@@ -0,0 +1 @@
+"""Tests for the Swiftly IS Straeto integration."""
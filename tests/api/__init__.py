@@ -0,0 +1 @@
+"""Tests for the Swiftly API client, which run without Home Assistant."""
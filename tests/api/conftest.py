@@ -0,0 +1,91 @@
+"""Fixtures for the Swiftly API client tests.
+
+The API client only depends on aiohttp, so it is imported from the
+integration directory, without loading the integration or Home Assistant.
+"""
+
+from collections.abc import AsyncIterator
+from pathlib import Path
+import sys
+
+from aiohttp import ClientSession, web
+import pytest
+
+sys.path.insert(
+    0,
+    str(
+        Path(__file__).resolve().parents[2] / "custom_components" / "swiftly_is_straeto"
+    ),
+)
+
+from api import SwiftlyAPIClient  # noqa: E402
+
+PREDICTIONS_PATH = f"/real-time/{SwiftlyAPIClient.AGENCY_KEY}/predictions"
+
+
+class FakeSwiftly:
+    """Predictions endpoint answering with the status chosen for the stops."""
+
+    def __init__(self) -> None:
+        """Initialize the endpoint accepting every stop."""
+        self.multi_stop = True
+        self.rejected: set[str] = set()
+        self.status: int | None = None
+        self.requests: list[list[str]] = []
+
+    async def predictions(self, request: web.Request) -> web.Response:
+        """Answer a predictions request for one or more stops."""
+        stop_ids = request.query["stop"].split(",")
+        self.requests.append(stop_ids)
+        if self.status is not None:
+            return web.json_response({"errorCode": self.status}, status=self.status)
+        if self.rejected.intersection(stop_ids) or (
+            len(stop_ids) > 1 and not self.multi_stop
+        ):
+            return web.json_response({"errorCode": 400}, status=400)
+        return web.json_response(
+            {
+                "success": True,
+                "route": PREDICTIONS_PATH,
+                "data": {
+                    "agencyKey": SwiftlyAPIClient.AGENCY_KEY,
+                    "predictionsData": [
+                        {
+                            "routeId": "1",
+                            "routeName": "Leið 1",
+                            "stopId": stop_id,
+                            "stopName": f"Stopp {stop_id}",
+                            "destinations": [],
+                        }
+                        for stop_id in stop_ids
+                    ],
+                },
+            }
+        )
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations() -> None:
+    """Run the API client tests without Home Assistant."""
+
+
+@pytest.fixture
+def swiftly() -> FakeSwiftly:
+    """Return the fake predictions endpoint."""
+    return FakeSwiftly()
+
+
+@pytest.fixture
+async def client(swiftly: FakeSwiftly) -> AsyncIterator[SwiftlyAPIClient]:
+    """Return an API client talking to the fake predictions endpoint."""
+    app = web.Application()
+    app.router.add_get(PREDICTIONS_PATH, swiftly.predictions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    async with ClientSession() as session:
+        client = SwiftlyAPIClient("key", session)
+        client.BASE_URL = f"http://127.0.0.1:{runner.addresses[0][1]}"
+        yield client
+    await runner.cleanup()
@@ -0,0 +1,108 @@
+"""Tests for fetching the predictions of several stops."""
+
+from api import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ServerError,
+    SwiftlyAPIClient,
+    batch_stops,
+    split_predictions,
+)
+import pytest
+
+from .conftest import FakeSwiftly
+
+STOPS = {"01000": ("1",), "02000": ("1",), "03000": ()}
+
+
+def test_batch_stops() -> None:
+    """Test stops are split into batches in order."""
+    assert batch_stops(STOPS, 2) == [
+        {"01000": ("1",), "02000": ("1",)},
+        {"03000": ()},
+    ]
+
+
+def test_split_predictions() -> None:
+    """Test a batch response is split by stop and filtered by route."""
+    items = [
+        {"stopId": "01000", "routeId": "1"},
+        {"stopId": "01000", "routeId": "2"},
+        {"stopId": "03000", "routeId": "2"},
+        {"stopId": "09000", "routeId": "1"},
+    ]
+    assert split_predictions(STOPS, {"predictionsData": items}) == {
+        "01000": [items[0]],
+        "02000": [],
+        "03000": [items[2]],
+    }
+
+
+async def test_batch_in_one_request(
+    client: SwiftlyAPIClient, swiftly: FakeSwiftly
+) -> None:
+    """Test the stops of a batch share one request."""
+    result = await client.get_predictions_for_stops(STOPS, errors={})
+
+    assert list(result) == list(STOPS)
+    assert swiftly.requests == [list(STOPS)]
+
+
+async def test_rejected_stop_keeps_batching(
+    client: SwiftlyAPIClient, swiftly: FakeSwiftly
+) -> None:
+    """Test a batch rejected for one of its stops is retried per stop."""
+    swiftly.rejected = {"02000"}
+    errors: dict[str, Exception] = {}
+
+    result = await client.get_predictions_for_stops(STOPS, errors=errors)
+
+    assert list(result) == ["01000", "03000"]
+    assert list(errors) == ["02000"]
+    assert len(swiftly.requests) == 1 + len(STOPS)
+    assert client.multi_stop_supported
+
+
+async def test_batching_off_without_multi_stop(
+    client: SwiftlyAPIClient, swiftly: FakeSwiftly
+) -> None:
+    """Test batching is turned off when every stop works on its own."""
+    swiftly.multi_stop = False
+
+    result = await client.get_predictions_for_stops(STOPS, errors={})
+
+    assert list(result) == list(STOPS)
+    assert not client.multi_stop_supported
+    swiftly.requests.clear()
+    await client.get_predictions_for_stops(STOPS, errors={})
+    assert swiftly.requests == [[stop_id] for stop_id in STOPS]
+
+
+async def test_server_error_not_retried_per_stop(
+    client: SwiftlyAPIClient, swiftly: FakeSwiftly
+) -> None:
+    """Test a server error fails the batch with a single request."""
+    swiftly.status = 503
+    errors: dict[str, Exception] = {}
+
+    result = await client.get_predictions_for_stops(STOPS, errors=errors)
+
+    assert result == {}
+    assert list(errors) == list(STOPS)
+    assert all(isinstance(err, ServerError) for err in errors.values())
+    assert len(swiftly.requests) == 1
+    assert client.multi_stop_supported
+
+
+async def test_open_circuit_sends_nothing(
+    client: SwiftlyAPIClient, swiftly: FakeSwiftly
+) -> None:
+    """Test no request is sent while the circuit is open."""
+    client.circuit_breaker = CircuitBreaker(failure_threshold=1)
+    client.circuit_breaker.record_failure()
+
+    # The whole API is failing, not the stops, so the error is not per stop.
+    with pytest.raises(CircuitOpenError):
+        await client.get_predictions_for_stops(STOPS, errors={})
+
+    assert swiftly.requests == []
@@ -0,0 +1,54 @@
+"""Tests for the client side rate limiting."""
+
+import asyncio
+import time
+
+from api import TokenBucket
+
+
+async def test_tokens_are_paced() -> None:
+    """Test callers beyond the burst wait for the refill."""
+    bucket = TokenBucket(limit=20, period=1, burst=1)
+    start = time.monotonic()
+
+    assert await bucket.acquire()
+    assert await bucket.acquire()
+
+    assert time.monotonic() - start >= 0.04
+
+
+async def test_max_wait_includes_time_queued() -> None:
+    """Test max_wait counts the time spent behind other waiters."""
+    bucket = TokenBucket(limit=5, period=1, burst=1)
+    assert await bucket.acquire()
+    # The first waiter holds the queue until the next token, 0.2 s from now.
+    first = asyncio.create_task(bucket.acquire())
+    await asyncio.sleep(0)
+    start = time.monotonic()
+
+    assert not await bucket.acquire(max_wait=0.1)
+
+    assert time.monotonic() - start < 0.2
+    assert await first
+
+
+async def test_max_wait_refuses_without_taking_a_token() -> None:
+    """Test a caller that would wait too long leaves the tokens alone."""
+    bucket = TokenBucket(limit=1, period=10, burst=1)
+    assert await bucket.acquire()
+
+    assert not await bucket.acquire(max_wait=0.1)
+
+    assert bucket.remaining == 0
+    bucket.configure(limit=1000, period=1, burst=1)
+    assert await bucket.acquire(max_wait=0.1)
+
+
+async def test_pause_holds_requests() -> None:
+    """Test a pause refuses callers that cannot wait for it to end."""
+    bucket = TokenBucket(limit=100, period=1, burst=10)
+    bucket.pause(10)
+
+    assert bucket.remaining == 0
+    assert not await bucket.acquire(max_wait=0.1)
+    assert 9 < bucket.paused_for <= 10
@@ -0,0 +1,8 @@
+"""Fixtures for Swiftly IS Straeto tests."""
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(enable_custom_integrations: None) -> None:
+    """Load the integration from custom_components in every test."""
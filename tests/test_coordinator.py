@@ -0,0 +1,162 @@
+"""Tests for the Swiftly IS Straeto coordinators."""
+
+from datetime import timedelta
+from types import MappingProxyType
+
+from freezegun.api import FrozenDateTimeFactory
+from homeassistant.core import HomeAssistant
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.swiftly_is_straeto.api import (
+    CircuitBreaker,
+    ResponseTracker,
+    ServerError,
+    TokenBucket,
+)
+from custom_components.swiftly_is_straeto.const import (
+    CONF_TRACKER_INTERVAL,
+    CONF_VEHICLE_TTL,
+    DOMAIN,
+)
+from custom_components.swiftly_is_straeto.coordinator import (
+    SwiftlyIsStraetoPredictionCoordinator,
+    SwiftlyIsStraetoVehicleCoordinator,
+)
+from custom_components.swiftly_is_straeto.polling import PollingPlan, PollingSchedule
+
+VEHICLE = {
+    "id": "10001",
+    "routeId": "1",
+    "routeName": "Leið 1",
+    "headsign": "Hlemmur",
+    "loc": {"lat": 64.1355, "lon": -21.8954, "time": 0, "speed": 0, "heading": 0},
+    "schAdhSecs": 30,
+    "schAdhStr": "30 sec late",
+    "scheduledHeadwaySecs": 600,
+    "nextStopName": "Hlemmur",
+    "blockId": "1-0001",
+}
+
+PREDICTION = {
+    "routeId": "1",
+    "routeName": "Leið 1",
+    "stopId": "90000",
+    "stopName": "Hlemmur",
+    "destinations": [{"headsign": "Hlemmur", "predictions": []}],
+}
+
+
+class FakeAPIClient:
+    """API client serving a fixed list of vehicles."""
+
+    multi_stop_supported = True
+
+    def __init__(self) -> None:
+        """Initialize the client without vehicles or predictions."""
+        self.vehicles: list[dict] = []
+        self.predictions: dict[str, list[dict]] = {}
+        self.error: Exception | None = None
+        self.requested: list[set[str]] = []
+        self.circuit_breaker = CircuitBreaker()
+        self.rate_limiter = TokenBucket(180, 900, 10)
+
+    async def get_vehicles(
+        self,
+        route: list[str] | None = None,
+        verbose: bool = False,
+        tracker: ResponseTracker | None = None,
+    ) -> dict:
+        """Return the current vehicles, changed or not."""
+        return {"vehicles": list(self.vehicles)}
+
+    async def get_predictions_for_stops(
+        self,
+        stops: dict[str, tuple[str, ...]],
+        *,
+        errors: dict[str, Exception],
+        **kwargs: object,
+    ) -> dict[str, list[dict]]:
+        """Return the predictions of the stops, or fail every stop with the error."""
+        self.requested.append(set(stops))
+        if self.error is not None:
+            errors.update(dict.fromkeys(stops, self.error))
+            return {}
+        return {stop: self.predictions.get(stop, []) for stop in stops}
+
+
+async def test_expiry_notifies_listeners_when_data_is_unchanged(
+    hass: HomeAssistant, freezer: FrozenDateTimeFactory
+) -> None:
+    """Test vehicles expiring on a refresh with unchanged data are published."""
+    entry = MockConfigEntry(
+        domain=DOMAIN, options={CONF_VEHICLE_TTL: 1, CONF_TRACKER_INTERVAL: 0}
+    )
+    entry.add_to_hass(hass)
+    client = FakeAPIClient()
+    client.vehicles = [VEHICLE]
+    coordinator = SwiftlyIsStraetoVehicleCoordinator(
+        hass,
+        entry,
+        client,
+        PollingSchedule(),
+        PollingPlan(
+            routes=("1",), vehicle_subentries=MappingProxyType({"1": "subentry"})
+        ),
+    )
+    expired: list[frozenset[str]] = []
+    unsubscribe = coordinator.async_add_listener(
+        lambda: expired.append(coordinator.delta.expired)
+    )
+
+    await coordinator.async_refresh()
+    client.vehicles = []
+    await coordinator.async_refresh()
+    assert expired == [frozenset(), frozenset()]
+
+    # The fleet stays empty, so only the expiry differs from the last refresh.
+    freezer.tick(timedelta(minutes=2))
+    await coordinator.async_refresh()
+    assert expired[-1] == frozenset({"1-0001"})
+
+    # Expired vehicles are only published once.
+    await coordinator.async_refresh()
+    assert all(not keys for keys in expired[3:])
+
+    unsubscribe()
+    await coordinator.async_shutdown()
+
+
+async def test_stale_predictions_stay_stale_while_no_stop_is_due(
+    hass: HomeAssistant, freezer: FrozenDateTimeFactory
+) -> None:
+    """Test a refresh with every stop backing off keeps the snapshot stale."""
+    entry = MockConfigEntry(domain=DOMAIN)
+    entry.add_to_hass(hass)
+    client = FakeAPIClient()
+    client.predictions = {"90000": [PREDICTION]}
+    coordinator = SwiftlyIsStraetoPredictionCoordinator(
+        hass,
+        entry,
+        client,
+        PollingSchedule(),
+        PollingPlan(
+            stops=MappingProxyType({"90000": ("1",)}),
+            prediction_subentries=MappingProxyType({("90000", "1"): "subentry"}),
+        ),
+    )
+
+    await coordinator.async_refresh()
+    assert coordinator.data.stale_since is None
+
+    client.error = ServerError("Unexpected server error 503.")
+    await coordinator.async_refresh()
+    stale_since = coordinator.data.stale_since
+    assert stale_since is not None
+
+    # The stop is backing off, so nothing is requested and nothing recovers.
+    await coordinator.async_refresh()
+    assert len(client.requested) == 2
+    assert coordinator.last_update_success
+    assert coordinator.data.stale_since == stale_since
+
+    await coordinator.async_shutdown()